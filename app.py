@@ -1,19 +1,38 @@
 import datetime
-import json
 import logging
 import sys
 import time
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from threading import Lock
-from functools import lru_cache
+from functools import lru_cache, partial
+from itertools import pairwise
+from operator import itemgetter
+import orjson
 from flask import Flask, Response, jsonify, render_template, request
 from skyscanner import SkyScanner
 from skyscanner.errors import GenericError, AttemptsExhaustedIncompleteResponse, BannedWithCaptcha
 from skyscanner.types import Airport, SpecialTypes
 
+try:
+    from ciso8601 import parse_datetime as _parse_datetime
+except ImportError:  # ciso8601 è opzionale, fallback sulla stdlib
+    _parse_datetime = datetime.datetime.fromisoformat
+
 # Configurazione parallelismo e timeout
 MAX_WORKERS = 20  # Numero di chiamate API in parallelo
 SEARCH_TIMEOUT_SECONDS = 300  # Timeout globale di 5 minuti
+AIRPORT_CACHE_TTL_SECONDS = 3600  # Validità dei risultati di search_airports
+AIRPORT_CACHE_MAX_ENTRIES = 2048  # Oltre, si scartano le ricerche usate meno di recente
+GEO_HIERARCHY_CACHE_TTL_SECONDS = 86400  # La gerarchia geografica cambia di rado
+PROGRESS_MIN_INTERVAL_SECONDS = 0.1  # Al massimo ~10 eventi di progresso al secondo
+RESULTS_BATCH_SIZE = 16  # Voli per evento SSE "results"
+RESULTS_BATCH_MAX_WAIT_SECONDS = 0.5  # Attesa massima prima di inviare un lotto incompleto
+
+# Default condiviso per i .get() annidati: evita un dict vuoto per chiamata.
+# Non va mai modificato.
+_EMPTY = {}
 
 
 logging.basicConfig(
@@ -26,71 +45,209 @@ app = Flask(__name__)
 logger = logging.getLogger(__name__)
 
 
+_scanner = None
+# Sessione curl del primo client: sopravvive ai reset dopo un captcha, così
+# il nuovo client riusa le connessioni TLS già aperte verso Skyscanner
+_session = None
+_scanner_lock = Lock()
+
+
 def build_scanner() -> SkyScanner:
-    # Ridotto retry per velocizzare le ricerche (default: retry_delay=2, max_retries=15)
-    return SkyScanner(locale="it-IT", currency="EUR", market="IT", retry_delay=1, max_retries=8)
+    # Un solo client per processo: sessione curl (connessioni keep-alive) e
+    # token PX vengono riutilizzati tra le richieste Flask
+    global _scanner, _session
+    scanner = _scanner
+    if scanner is None:
+        with _scanner_lock:
+            if _scanner is None:
+                # Ridotto retry per velocizzare le ricerche (default: retry_delay=2, max_retries=15)
+                _scanner = SkyScanner(
+                    locale="it-IT",
+                    currency="EUR",
+                    market="IT",
+                    retry_delay=1,
+                    max_retries=8,
+                    session=_session,
+                )
+                _session = _scanner.session
+            scanner = _scanner
+    return scanner
+
+
+def reset_scanner(stale: SkyScanner):
+    # Dopo un captcha il token PX è bruciato: la prossima build_scanner() ne crea
+    # uno nuovo. Il confronto evita di scartare un client già ricreato da un altro thread
+    global _scanner
+    with _scanner_lock:
+        if _scanner is stale:
+            _scanner = None
+            # I cookie legati al token bruciato non vanno riusati; le connessioni sì
+            stale.session.cookies.clear()
 
 
 class AirportCache:
-    """Cache thread-safe per i risultati di search_airports"""
-    def __init__(self):
-        self._cache = {}
+    """Cache thread-safe con scadenza e dimensione massima (LRU) per i risultati
+    di search_airports: l'autocompletamento vi salva ogni testo digitato"""
+    def __init__(self, ttl=AIRPORT_CACHE_TTL_SECONDS, maxsize=AIRPORT_CACHE_MAX_ENTRIES):
+        self._cache = OrderedDict()
+        self._ttl = ttl
+        self._maxsize = maxsize
         self._lock = Lock()
+        self._code_locks = {}
 
     def get(self, scanner: SkyScanner, code: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(code)
+            if entry is not None:
+                if entry[0] > now:
+                    self._cache.move_to_end(code)
+                    return entry[1]
+                # Scaduta: la tolgo subito invece di lasciarla in memoria
+                del self._cache[code]
+            code_lock = self._code_locks.setdefault(code, Lock())
+
+        # Esegui la ricerca fuori dal lock globale; i thread che chiedono lo
+        # stesso codice aspettano la prima ricerca invece di ripeterla
+        with code_lock:
+            with self._lock:
+                entry = self._cache.get(code)
+                if entry is not None and entry[0] > now:
+                    return entry[1]
+            try:
+                result = scanner.search_airports(code)
+                with self._lock:
+                    self._cache[code] = (now + self._ttl, result)
+                    self._cache.move_to_end(code)
+                    while len(self._cache) > self._maxsize:
+                        self._cache.popitem(last=False)
+            finally:
+                with self._lock:
+                    # Un thread arrivato dopo può aver già creato un lock nuovo: non toglierlo
+                    if self._code_locks.get(code) is code_lock:
+                        del self._code_locks[code]
+        return result
+
+    def clear(self):
         with self._lock:
-            if code in self._cache:
-                return self._cache[code]
+            self._cache.clear()
 
-        # Esegui la ricerca fuori dal lock
-        result = scanner.search_airports(code)
 
+# Cache globale per gli aeroporti, condivisa tra le richieste
+_airport_cache = AirportCache()
+
+
+class GeoHierarchyCache:
+    """Cache thread-safe con scadenza per la gerarchia di get_flight_geo_hierarchy"""
+    def __init__(self, ttl=GEO_HIERARCHY_CACHE_TTL_SECONDS):
+        self._entry = None
+        self._ttl = ttl
+        self._lock = Lock()
+
+    def get(self, scanner: SkyScanner):
+        now = time.monotonic()
+        entry = self._entry
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        # È il payload più grande: un solo thread lo scarica, gli altri attendono
         with self._lock:
-            self._cache[code] = result
+            entry = self._entry
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            result = scanner.get_flight_geo_hierarchy()
+            self._entry = (now + self._ttl, result)
         return result
 
     def clear(self):
         with self._lock:
-            self._cache.clear()
+            self._entry = None
 
 
-# Cache globale per gli aeroporti (una per sessione di ricerca)
-_airport_cache = AirportCache()
+_geo_hierarchy_cache = GeoHierarchyCache()
+
+
+class RouteClaims:
+    """Tratte (origine, destinazione) già richieste durante una singola ricerca"""
+    def __init__(self):
+        self._seen = set()
+        self._lock = Lock()
+
+    def claim(self, origin: Airport, dest: Airport) -> bool:
+        # True solo per la prima richiesta della tratta: città diverse possono
+        # risolvere allo stesso aeroporto
+        key = (origin.skyId, dest.skyId)
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            return True
 
 
 def parse_date(date_str: str) -> datetime.datetime:
-    return datetime.datetime.strptime(date_str, "%d/%m/%Y")
+    # Formato fisso GG/MM/AAAA: slicing diretto invece di strptime
+    if len(date_str) != 10 or date_str[2] != "/" or date_str[5] != "/":
+        raise ValueError(f"Data non valida: {date_str!r}")
+    return datetime.datetime(
+        int(date_str[6:10]), int(date_str[3:5]), int(date_str[:2])
+    )
+
+
+@lru_cache(maxsize=4096)
+def parse_iso_datetime(value: str) -> datetime.datetime:
+    # Gli stessi orari si ripetono tra bucket e segmenti: cache sulla stringa ISO
+    return _parse_datetime(value)
 
 
 def airport_from_code(scanner: SkyScanner, code: str) -> Airport:
-    return scanner.get_airport_by_code(code)
+    for airport in _airport_cache.get(scanner, code):
+        if airport.skyId == code:
+            return airport
+    raise GenericError(f"IATA code not found: {code}")
+
 
+def airports_from_codes(scanner: SkyScanner, codes) -> list[Airport]:
+    # Le ricerche degli aeroporti partono insieme; map mantiene l'ordine dei
+    # codici e rilancia il GenericError del primo codice non trovato
+    if len(codes) <= 1:
+        return [airport_from_code(scanner, code) for code in codes]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(codes))) as executor:
+        return list(executor.map(lambda code: airport_from_code(scanner, code), codes))
 
+
+def iso_minutes(value: str) -> int:
+    # Minuti dalla mezzanotte di una stringa AAAA-MM-GGTHH:MM[:SS]
+    return int(value[11:13]) * 60 + int(value[14:16])
+
+
+@lru_cache(maxsize=512)
 def normalize_carrier_name(name: str) -> str:
+    # Le compagnie sono poche decine: cache sul nome grezzo e stringhe
+    # internate, così tutti i voli condividono lo stesso oggetto
     if not name:
         return "N/A"
-    lower_name = name.strip().lower()
-    if "easyjet" in lower_name:
+    stripped = name.strip()
+    if "easyjet" in stripped.lower():
         return "easyJet"
-    return name.strip()
+    return sys.intern(stripped)
 
 
-def normalize_selected_locations(items):
-    normalized = []
-    for item in items or []:
+def normalize_and_dedupe(items):
+    """Normalizza le località selezionate e rimuove i codici duplicati in un solo passaggio."""
+    normalized = {}
+    for item in items or ():
         if isinstance(item, str):
-            normalized.append({"code": item, "entity_type": "", "title": ""})
+            if item not in normalized:
+                normalized[item] = {"code": item, "entity_type": "", "title": ""}
             continue
         if isinstance(item, dict):
             code = item.get("code") or item.get("skyId")
-            if not code:
+            if not code or code in normalized:
                 continue
             entity_type = item.get("entityType") or item.get("entity_type") or ""
             title = item.get("title") or item.get("label") or ""
-            normalized.append(
-                {"code": code, "entity_type": entity_type, "title": title}
-            )
-    return normalized
+            normalized[code] = {"code": code, "entity_type": entity_type, "title": title}
+    return list(normalized.values()), list(normalized)
 
 
 def dedupe_codes(items):
@@ -114,51 +271,95 @@ def parse_optional_price(value):
 def extract_country_places(hierarchy, country_code):
     matches = {}
 
-    def walk(node, current_country=None):
-        if isinstance(node, dict):
-            place_type = (
-                node.get("placeType")
-                or node.get("place_type")
-                or node.get("type")
-                or ""
-            )
-            sky_code = node.get("skyCode") or node.get("skyId") or node.get("id")
-            name = node.get("name") or node.get("title") or node.get("placeName")
+    # Visita iterativa in pre-ordine: stesso ordine dei risultati della
+    # ricorsione, senza un frame Python per nodo
+    stack = [(hierarchy, None)]
+    while stack:
+        node, current_country = stack.pop()
+        if isinstance(node, list):
+            stack.extend((item, current_country) for item in reversed(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+
+        place_type = (
+            node.get("placeType")
+            or node.get("place_type")
+            or node.get("type")
+            or ""
+        )
+        sky_code = node.get("skyCode") or node.get("skyId") or node.get("id")
+
+        if "COUNTRY" in place_type:
+            if sky_code != country_code:
+                # Il sottoalbero di un altro paese non va visitato
+                continue
+            current_country = country_code
+
+        normalized_type = None
+        if "CITY" in place_type:
+            normalized_type = "CITY"
+        elif "AIRPORT" in place_type:
+            normalized_type = "AIRPORT"
+
+        if normalized_type and sky_code:
             country_id = (
                 node.get("countryId") or node.get("countryCode") or node.get("country")
             )
+            if country_id == country_code or current_country == country_code:
+                name = node.get("name") or node.get("title") or node.get("placeName")
+                matches[sky_code] = {
+                    "skyCode": sky_code,
+                    "name": name or sky_code,
+                    "type": normalized_type,
+                }
 
-            if "COUNTRY" in place_type and sky_code == country_code:
-                current_country = country_code
-
-            normalized_type = None
-            if "CITY" in place_type:
-                normalized_type = "CITY"
-            elif "AIRPORT" in place_type:
-                normalized_type = "AIRPORT"
-
-            if normalized_type and sky_code:
-                if country_id == country_code or current_country == country_code:
-                    matches[sky_code] = {
-                        "skyCode": sky_code,
-                        "name": name or sky_code,
-                        "type": normalized_type,
-                    }
-
-            for value in node.values():
-                if isinstance(value, (dict, list)):
-                    walk(value, current_country)
-        elif isinstance(node, list):
-            for item in node:
-                walk(item, current_country)
+        stack.extend(
+            (value, current_country)
+            for value in reversed(node.values())
+            if isinstance(value, (dict, list))
+        )
 
-    walk(hierarchy)
     return list(matches.values())
 
 
+class CountryPlacesCache:
+    """Cache thread-safe con scadenza per le città/aeroporti di ogni paese"""
+    def __init__(self, ttl=AIRPORT_CACHE_TTL_SECONDS):
+        self._cache = {}
+        self._ttl = ttl
+        self._lock = Lock()
+
+    def get(self, scanner: SkyScanner, country_code: str, country_name: str):
+        key = (scanner.market, country_code, country_name)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        # Tupla: il risultato è condiviso tra le richieste e non va modificato
+        result = tuple(_fetch_country_places(scanner, country_code, country_name))
+
+        with self._lock:
+            self._cache[key] = (now + self._ttl, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_country_places_cache = CountryPlacesCache()
+
+
 def get_country_places(scanner: SkyScanner, country_code: str, country_name: str):
+    return _country_places_cache.get(scanner, country_code, country_name)
+
+
+def _fetch_country_places(scanner: SkyScanner, country_code: str, country_name: str):
     try:
-        hierarchy = scanner.get_flight_geo_hierarchy()
+        hierarchy = _geo_hierarchy_cache.get(scanner)
         places = extract_country_places(hierarchy, country_code)
         if places:
             return places
@@ -166,7 +367,7 @@ def get_country_places(scanner: SkyScanner, country_code: str, country_name: str
         pass
 
     query = country_name or country_code
-    results = scanner.search_airports(query)
+    results = _airport_cache.get(scanner, query)
     return [
         {
             "skyCode": airport.skyId,
@@ -182,6 +383,166 @@ def get_country_places(scanner: SkyScanner, country_code: str, country_name: str
     ]
 
 
+def expand_country_places(scanner: SkyScanner, country_items):
+    """Città/aeroporti di tutti i paesi selezionati, espansi in parallelo."""
+    expanded = []
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(country_items))) as executor:
+        for places in executor.map(
+            lambda item: get_country_places(scanner, item["code"], item.get("title", "")),
+            country_items,
+        ):
+            expanded.extend(places)
+    return expanded
+
+
+def iter_priced_locations(response, results_key, max_price):
+    """Terne (skyCode, nome, entityId) dei risultati EVERYWHERE/paese con prezzo entro max_price."""
+    for r in response.json.get(results_key, _EMPTY).get("results", ()):
+        # Accesso diretto: i campi mancano solo nei risultati incompleti
+        try:
+            content = r["content"]
+            location = content["location"]
+            name = location["name"]
+            sky_code = location["skyCode"]
+        except (KeyError, TypeError):
+            continue
+        if not name or not sky_code:
+            continue
+        try:
+            price = content["flightQuotes"]["cheapest"]["rawPrice"]
+        except (KeyError, TypeError):
+            price = 999999
+        if price and price <= max_price:
+            yield sky_code, name, location.get("id")
+
+
+def iter_everywhere_responses(scanner: SkyScanner, origin_list, depart_date):
+    """Ricerche EVERYWHERE di tutte le origini in parallelo, restituite nell'ordine di origin_list."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        responses = executor.map(
+            lambda origin: scanner.get_flight_prices(
+                origin=origin,
+                destination=SpecialTypes.EVERYWHERE,
+                depart_date=depart_date,
+            ),
+            origin_list,
+        )
+        try:
+            yield from zip(origin_list, responses)
+        except Exception as exc:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if isinstance(exc, BannedWithCaptcha):
+                reset_scanner(scanner)
+            raise
+
+
+def fetch_country_response(scanner: SkyScanner, origin: Airport, country, depart_date):
+    if country.get("entityId"):
+        # Il risultato EVERYWHERE contiene già l'entità del paese: niente search_airports
+        country_entity = Airport(
+            title=country["name"],
+            entity_id=country["entityId"],
+            skyId=country["skyCode"],
+            entity_type="COUNTRY",
+        )
+        return scanner.get_flight_prices(
+            origin=origin,
+            destination=country_entity,
+            depart_date=depart_date,
+        )
+
+    country_airports = _airport_cache.get(scanner, country["skyCode"])
+    if not country_airports:
+        return None
+    country_entity = next(
+        (a for a in country_airports if a.skyId == country["skyCode"]),
+        country_airports[0],
+    )
+    return scanner.get_flight_prices(
+        origin=origin,
+        destination=country_entity,
+        depart_date=depart_date,
+    )
+
+
+def format_minutes(minutes: int) -> str:
+    hours, mins = divmod(minutes, 60)
+    return f"{hours}h {mins:02d}min"
+
+
+@dataclass(slots=True)
+class _FlightCandidate:
+    """Itinerario che ha superato i filtri, in attesa di diventare un volo."""
+
+    price: float
+    leg: dict
+    stops: int
+    partenza: str
+    arrivo: str
+    carrier_name: str
+    codice_origine: str
+    codice_dest: str
+
+
+def build_flight(candidate: _FlightCandidate, city):
+    leg = candidate.leg
+    stops = candidate.stops
+    carriers = leg.get("carriers", _EMPTY).get("marketing", ())
+    dest_info = leg.get("destination", _EMPTY)
+
+    duration = leg.get("durationInMinutes", 0)
+    segments = leg.get("segments", ())
+    stopovers = []
+    if stops > 0 and len(segments) > 1:
+        for seg, next_seg in pairwise(segments):
+            stop_dest = seg.get("destination", _EMPTY)
+            stop_city = stop_dest.get("city", stop_dest.get("name", ""))
+            stop_code = stop_dest.get("displayCode", "")
+
+            seg_arr = seg.get("arrival", "")
+            next_dep = next_seg.get("departure", "")
+
+            layover_min = 0
+            if seg_arr and next_dep:
+                try:
+                    if seg_arr[:10] == next_dep[:10]:
+                        # Stesso giorno: bastano ore e minuti della stringa ISO
+                        layover_min = iso_minutes(next_dep) - iso_minutes(seg_arr)
+                    else:
+                        delta = parse_iso_datetime(next_dep) - parse_iso_datetime(seg_arr)
+                        layover_min = int(delta.total_seconds() / 60)
+                except ValueError:
+                    layover_min = 0
+
+            stopovers.append(
+                {
+                    "città": stop_city,
+                    "codice": stop_code,
+                    "arrivo": seg_arr[11:16],
+                    "partenza": next_dep[11:16],
+                    "attesa": format_minutes(layover_min) if layover_min > 0 else "",
+                }
+            )
+
+    carrier_logo = carriers[0].get("logoUrl") if carriers else ""
+
+    return {
+        "città": dest_info.get("city", city["name"]),
+        "paese": dest_info.get("country", city.get("country", "")),
+        "codice_dest": candidate.codice_dest,
+        "codice_origine": candidate.codice_origine,
+        "prezzo": candidate.price,
+        "partenza": candidate.partenza,
+        "arrivo": candidate.arrivo,
+        "durata": format_minutes(duration),
+        "durata_min": duration,
+        "scali": stops,
+        "stopovers": stopovers,
+        "compagnia": candidate.carrier_name,
+        "logo_url": carrier_logo,
+    }
+
+
 def process_flight_response(
     flight_response,
     origin: Airport,
@@ -194,133 +555,106 @@ def process_flight_response(
     max_arrival_hour,
     direct_only,
     same_day,
-    voli_trovati,
-    voli_keys,
+    voli_by_key,
 ):
     logged_carrier_payload = False
     voli_visti = set()
-    for bucket in flight_response.json.get("itineraries", {}).get("buckets", []):
-        for item in bucket.get("items", []):
-            if item["id"] in voli_visti:
+    candidates = {}
+    min_dep_hhmm = f"{min_hour:02d}:00"
+    max_dep_hhmm = f"{max_hour:02d}:00"
+    min_arr_hhmm = f"{min_arrival_hour:02d}:00"
+    max_arr_hhmm = f"{max_arrival_hour:02d}:00"
+    # Con la fascia oraria di default (0-24) i confronti sono sempre veri
+    filter_dep_time = not (min_hour == 0 and max_hour == 24)
+    filter_arr_time = not (min_arrival_hour == 0 and max_arrival_hour == 24)
+    origin_sky = origin.skyId
+    city_sky = city["skyCode"]
+    # Metodi usati per ogni itinerario legati una volta sola
+    seen_add = voli_visti.add
+    candidates_get = candidates.get
+    existing_get = voli_by_key.get
+    for bucket in flight_response.json.get("itineraries", _EMPTY).get("buckets", ()):
+        for item in bucket.get("items", ()):
+            # Prezzo per primo: scarta la maggior parte degli itinerari
+            # senza toccare il set dei già visti
+            try:
+                price = item["price"]["raw"]
+            except (KeyError, TypeError):
+                continue
+            if price is None or price > max_price:
+                continue
+
+            item_id = item["id"]
+            if item_id in voli_visti:
                 continue
-            voli_visti.add(item["id"])
+            seen_add(item_id)
 
-            price = item.get("price", {}).get("raw", 999999)
-            if price > max_price:
+            # Accesso diretto: i campi mancano solo in rari itinerari incompleti
+            try:
+                leg = item["legs"][0]
+                dep_str = leg["departure"]
+                arr_str = leg["arrival"]
+            except (KeyError, IndexError):
+                continue
+
+            # Filtri economici prima del parsing delle date
+            stops = leg.get("stopCount", 0)
+            if direct_only and stops > 0:
                 continue
 
-            leg = item.get("legs", [{}])[0]
-            dep_str = leg.get("departure", "")
-            arr_str = leg.get("arrival", "")
             if not dep_str or not arr_str:
                 continue
 
-            dep = datetime.datetime.fromisoformat(dep_str)
-            arr = datetime.datetime.fromisoformat(arr_str)
+            # Le stringhe ISO (AAAA-MM-GGTHH:MM:SS) sono a larghezza fissa:
+            # orari e date si confrontano direttamente, senza parsing
+            partenza = dep_str[11:16]
+            arrivo = arr_str[11:16]
 
             # Check departure time is within the selected range
-            dep_minutes = dep.hour * 60 + dep.minute
-            min_dep_minutes = min_hour * 60
-            max_dep_minutes = max_hour * 60
-            if dep_minutes < min_dep_minutes or dep_minutes > max_dep_minutes:
+            if filter_dep_time and (partenza < min_dep_hhmm or partenza > max_dep_hhmm):
                 continue
 
             # Check arrival time is within the selected range
-            arr_minutes = arr.hour * 60 + arr.minute
-            min_arr_minutes = min_arrival_hour * 60
-            max_arr_minutes = max_arrival_hour * 60
-            if arr_minutes < min_arr_minutes or arr_minutes > max_arr_minutes:
+            if filter_arr_time and (arrivo < min_arr_hhmm or arrivo > max_arr_hhmm):
                 continue
 
-            if same_day and arr.date() != dep.date():
-                continue
-
-            stops = leg.get("stopCount", 0)
-            if direct_only and stops > 0:
+            if same_day and arr_str[:10] != dep_str[:10]:
                 continue
 
-            duration = leg.get("durationInMinutes", 0)
-            carriers = leg.get("carriers", {}).get("marketing", [])
-            dest_info = leg.get("destination", {})
-            origin_info = leg.get("origin", {})
+            carriers = leg.get("carriers", _EMPTY).get("marketing", ())
+            dest_info = leg.get("destination", _EMPTY)
+            origin_info = leg.get("origin", _EMPTY)
 
             if carriers and not logged_carrier_payload:
                 logger.info("Carrier payload sample: %s", carriers)
                 logged_carrier_payload = True
 
-            segments = leg.get("segments", [])
-            stopovers = []
-            if stops > 0 and len(segments) > 1:
-                for seg_idx in range(len(segments) - 1):
-                    seg = segments[seg_idx]
-                    next_seg = segments[seg_idx + 1]
-
-                    stop_dest = seg.get("destination", {})
-                    stop_city = stop_dest.get("city", stop_dest.get("name", ""))
-                    stop_code = stop_dest.get("displayCode", "")
-
-                    seg_arr = seg.get("arrival", "")
-                    next_dep = next_seg.get("departure", "")
-
-                    layover_min = 0
-                    if seg_arr and next_dep:
-                        try:
-                            arr_time = datetime.datetime.fromisoformat(seg_arr)
-                            dep_time = datetime.datetime.fromisoformat(next_dep)
-                            layover_min = int((dep_time - arr_time).total_seconds() / 60)
-                        except ValueError:
-                            pass
-
-                    stopovers.append(
-                        {
-                            "città": stop_city,
-                            "codice": stop_code,
-                            "arrivo": datetime.datetime.fromisoformat(seg_arr).strftime("%H:%M")
-                            if seg_arr
-                            else "",
-                            "partenza": datetime.datetime.fromisoformat(next_dep).strftime("%H:%M")
-                            if next_dep
-                            else "",
-                            "attesa": f"{layover_min // 60}h {layover_min % 60:02d}min"
-                            if layover_min > 0
-                            else "",
-                        }
-                    )
-
             carrier_name = (
                 normalize_carrier_name(carriers[0].get("name", "N/A"))
                 if carriers
                 else "N/A"
             )
-            carrier_logo = carriers[0].get("logoUrl") if carriers else ""
-
-            flight = {
-                "città": dest_info.get("city", city["name"]),
-                "paese": dest_info.get("country", city.get("country", "")),
-                "codice_dest": dest_info.get("displayCode", city["skyCode"]),
-                "codice_origine": origin_info.get("displayCode", origin.skyId),
-                "prezzo": price,
-                "partenza": dep.strftime("%H:%M"),
-                "arrivo": arr.strftime("%H:%M"),
-                "durata": f"{duration // 60}h {duration % 60:02d}min",
-                "durata_min": duration,
-                "scali": stops,
-                "stopovers": stopovers,
-                "compagnia": carrier_name,
-                "logo_url": carrier_logo,
-            }
+            codice_dest = dest_info.get("displayCode", city_sky)
+            codice_origine = origin_info.get("displayCode", origin_sky)
+
+            # Deduplica prima di costruire scali e dizionario del volo
+            key = (codice_origine, codice_dest, partenza, carrier_name)
+            candidate = candidates_get(key)
+            if candidate is not None:
+                if price >= candidate.price:
+                    continue
+            else:
+                existing = existing_get(key)
+                if existing is not None and price >= existing["prezzo"]:
+                    continue
 
-            key = (
-                f"{flight['codice_origine']}-{flight['codice_dest']}-"
-                f"{flight['partenza']}-{carrier_name}"
+            candidates[key] = _FlightCandidate(
+                price, leg, stops, partenza, arrivo, carrier_name, codice_origine, codice_dest
             )
-            if key in voli_keys:
-                existing_idx = voli_keys[key]
-                if flight["prezzo"] < voli_trovati[existing_idx]["prezzo"]:
-                    voli_trovati[existing_idx] = flight
-            else:
-                voli_keys[key] = len(voli_trovati)
-                voli_trovati.append(flight)
+
+    # I dizionari vengono costruiti solo per i voli sopravvissuti alla deduplica
+    for key, candidate in candidates.items():
+        voli_by_key[key] = build_flight(candidate, city)
 
 
 def search_everywhere_multi(
@@ -336,94 +670,95 @@ def search_everywhere_multi(
     same_day,
 ):
     origin_codes = [o.skyId for o in origin_list]
-    all_countries = {}
-
-    for origin in origin_list:
-        response = scanner.get_flight_prices(
-            origin=origin,
-            destination=SpecialTypes.EVERYWHERE,
-            depart_date=depart_date,
-        )
-
-        for r in response.json.get("everywhereDestination", {}).get("results", []):
-            content = r.get("content", {})
-            location = content.get("location", {})
-            price = content.get("flightQuotes", {}).get("cheapest", {}).get(
-                "rawPrice", 999999
-            )
-            if location.get("name") and location.get("skyCode") and price and price <= max_price:
-                sky_code = location["skyCode"]
-                if sky_code not in all_countries:
-                    all_countries[sky_code] = {
-                        "name": location["name"],
-                        "skyCode": sky_code,
-                    }
-
-    countries = list(all_countries.values())
+    seen_countries = set()
+    countries = []
+
+    for origin, response in iter_everywhere_responses(scanner, origin_list, depart_date):
+
+        for sky_code, name, entity_id in iter_priced_locations(
+            response, "everywhereDestination", max_price
+        ):
+            if sky_code not in seen_countries:
+                seen_countries.add(sky_code)
+                countries.append(
+                    {"name": name, "skyCode": sky_code, "entityId": entity_id}
+                )
 
-    all_cities = {}
+    seen_cities = set()
+    cities = []
     first_origin = origin_list[0]
 
-    for country in countries:
-        country_airports = scanner.search_airports(country["skyCode"])
-        if not country_airports:
-            continue
-        country_entity = next(
-            (a for a in country_airports if a.skyId == country["skyCode"]),
-            country_airports[0],
-        )
+    voli_by_key = {}
+    # Filtri e dizionario dei risultati sono gli stessi per tutte le tratte
+    process = partial(
+        process_flight_response,
+        depart_date=depart_date,
+        max_price=max_price,
+        min_hour=min_hour,
+        max_hour=max_hour,
+        min_arrival_hour=min_arrival_hour,
+        max_arrival_hour=max_arrival_hour,
+        direct_only=direct_only,
+        same_day=same_day,
+        voli_by_key=voli_by_key,
+    )
 
-        country_response = scanner.get_flight_prices(
-            origin=first_origin,
-            destination=country_entity,
-            depart_date=depart_date,
+    route_claims = RouteClaims()
+
+    def fetch_route(city, origin):
+        city_airports = _airport_cache.get(scanner, city["skyCode"])
+        if not city_airports or not route_claims.claim(origin, city_airports[0]):
+            return None
+        return scanner.get_flight_prices(
+            origin=origin, destination=city_airports[0], depart_date=depart_date
         )
 
-        for r in country_response.json.get("countryDestination", {}).get("results", []):
-            content = r.get("content", {})
-            location = content.get("location", {})
-            city_price = content.get("flightQuotes", {}).get("cheapest", {}).get(
-                "rawPrice", 999999
+    # Pipeline: appena un paese restituisce le sue città partono le ricerche
+    # voli, senza aspettare che tutti i paesi siano stati espansi
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        country_futures = [
+            (
+                country,
+                executor.submit(
+                    fetch_country_response, scanner, first_origin, country, depart_date
+                ),
             )
-            if location.get("name") and location.get("skyCode") and city_price and city_price <= max_price:
-                sky_code = location["skyCode"]
-                if sky_code not in all_cities:
-                    all_cities[sky_code] = {
-                        "name": location["name"],
-                        "skyCode": sky_code,
-                        "country": country["name"],
-                    }
-
-    cities = list(all_cities.values())
+            for country in countries
+        ]
+        route_futures = []
 
-    voli_trovati = []
-    voli_keys = {}
+        try:
+            for country, future in country_futures:
+                country_response = future.result()
+                if country_response is None:
+                    continue
 
-    for city in cities:
-        for origin in origin_list:
-            city_airports = scanner.search_airports(city["skyCode"])
-            if not city_airports:
-                continue
+                for sky_code, name, _ in iter_priced_locations(
+                    country_response, "countryDestination", max_price
+                ):
+                    if sky_code in seen_cities:
+                        continue
+                    seen_cities.add(sky_code)
+                    city = {"name": name, "skyCode": sky_code, "country": country["name"]}
+                    cities.append(city)
+                    route_futures.extend(
+                        (city, origin, executor.submit(fetch_route, city, origin))
+                        for origin in origin_list
+                    )
 
-            flight_response = scanner.get_flight_prices(
-                origin=origin, destination=city_airports[0], depart_date=depart_date
-            )
+            for city, origin, future in route_futures:
+                flight_response = future.result()
+                if flight_response is None:
+                    continue
 
-            process_flight_response(
-                flight_response,
-                origin,
-                city,
-                depart_date,
-                max_price,
-                min_hour,
-                max_hour,
-                min_arrival_hour,
-                max_arrival_hour,
-                direct_only,
-                same_day,
-                voli_trovati,
-                voli_keys,
-            )
+                process(flight_response, origin, city)
+        except Exception as exc:
+            # Al primo errore le ricerche ancora in coda non partono: l'uscita dal
+            # blocco with non aspetta più tutte le chiamate con i loro tentativi
+            executor.shutdown(wait=False, cancel_futures=True)
+            if isinstance(exc, BannedWithCaptcha):
+                reset_scanner(scanner)
+            raise
 
     stats = {
         "paesi": len(countries),
@@ -431,7 +766,7 @@ def search_everywhere_multi(
         "partenze": ", ".join(origin_codes),
     }
 
-    return voli_trovati, stats
+    return list(voli_by_key.values()), stats
 
 
 def search_specific_destinations(
@@ -450,49 +785,68 @@ def search_specific_destinations(
     origin_codes = [o.skyId for o in origin_list]
     dest_codes = [d.skyId for d in dest_list]
 
-    voli_trovati = []
-    voli_keys = {}
+    voli_by_key = {}
+    # Filtri e dizionario dei risultati sono gli stessi per tutte le tratte
+    process = partial(
+        process_flight_response,
+        depart_date=depart_date,
+        max_price=max_price,
+        min_hour=min_hour,
+        max_hour=max_hour,
+        min_arrival_hour=min_arrival_hour,
+        max_arrival_hour=max_arrival_hour,
+        direct_only=direct_only,
+        same_day=same_day,
+        voli_by_key=voli_by_key,
+    )
+
+    responses = scanner.get_flight_prices_batch(
+        [(origin, dest) for origin in origin_list for dest in dest_list],
+        depart_date=depart_date,
+        max_workers=MAX_WORKERS,
+    )
 
     for origin in origin_list:
         for dest in dest_list:
-            flight_response = scanner.get_flight_prices(
-                origin=origin, destination=dest, depart_date=depart_date
-            )
+            flight_response = responses[(origin.skyId, dest.skyId)]
+            if isinstance(flight_response, Exception):
+                # Come la ricerca sequenziale: il primo errore arriva al client
+                logger.warning(f"Errore ricerca {origin.skyId} -> {dest.skyId}: {flight_response}")
+                if isinstance(flight_response, BannedWithCaptcha):
+                    reset_scanner(scanner)
+                raise flight_response
 
             city_info = {"name": dest.title, "skyCode": dest.skyId, "country": ""}
 
-            process_flight_response(
-                flight_response,
-                origin,
-                city_info,
-                depart_date,
-                max_price,
-                min_hour,
-                max_hour,
-                min_arrival_hour,
-                max_arrival_hour,
-                direct_only,
-                same_day,
-                voli_trovati,
-                voli_keys,
-            )
+            process(flight_response, origin, city_info)
 
     stats = {
         "partenze": ", ".join(origin_codes),
         "destinazioni": ", ".join(dest_codes),
     }
 
-    return voli_trovati, stats
+    return list(voli_by_key.values()), stats
+
+
+# Chiavi di ordinamento costruite una volta sola: tutti i voli hanno questi campi
+_SORT_KEYS = {
+    "orario": itemgetter("partenza"),
+    "durata": itemgetter("durata_min"),
+    "prezzo": itemgetter("prezzo"),
+}
+_TOTAL_PRICE_KEY = itemgetter("prezzo_totale")
 
 
 def sort_flights(flights, sort_key):
-    if sort_key == "orario":
-        return sorted(flights, key=lambda f: f.get("partenza", "00:00"))
-    if sort_key == "durata":
-        return sorted(flights, key=lambda f: f.get("durata_min", 0))
-    return sorted(
-        flights, key=lambda f: f.get("prezzo_totale", f.get("prezzo", 0))
-    )
+    key = _SORT_KEYS.get(sort_key)
+    if key is None or sort_key == "prezzo":
+        # Le liste andata-ritorno hanno tutte prezzo_totale
+        if flights and "prezzo_totale" in flights[0]:
+            key = _TOTAL_PRICE_KEY
+        else:
+            key = _SORT_KEYS["prezzo"]
+    flights.sort(key=key)
+    return flights
 
 
 def attach_return_flights(outbound_flights, return_flights, total_max_price=None):
@@ -539,13 +893,84 @@ def attach_return_flights(outbound_flights, return_flights, total_max_price=None
                 }
             )
 
-    # Ordina per prezzo totale
-    combined.sort(key=lambda x: x.get("prezzo_totale", 0))
+    # Nessun ordinamento qui: i chiamanti uniscono le combinazioni di più
+    # tratte e ordinano una sola volta con sort_flights
     return combined
 
 
 def sse_event(payload):
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+def search_progress(search_count, total_searches, found):
+    return {
+        "type": "progress",
+        "message": f"Completate {search_count}/{total_searches} ricerche",
+        "current": search_count,
+        "total": total_searches,
+        "found": found,
+    }
+
+
+class ProgressThrottle:
+    """Limita la frequenza degli eventi SSE di progresso: quelli troppo ravvicinati
+    vengono sostituiti dal successivo e l'ultimo rimasto esce con flush()"""
+    def __init__(self, interval=PROGRESS_MIN_INTERVAL_SECONDS):
+        self._interval = interval
+        self._last = float("-inf")
+        self._pending = None
+
+    def update(self, payload):
+        # Ritorna l'evento da inviare subito, oppure None se è stato accodato
+        now = time.monotonic()
+        if now - self._last < self._interval:
+            self._pending = payload
+            return None
+        self._last = now
+        self._pending = None
+        return sse_event(payload)
+
+    def emit(self, payload):
+        # Per i messaggi di fase: sempre inviati, scartano l'eventuale accodato
+        self._last = time.monotonic()
+        self._pending = None
+        return sse_event(payload)
+
+    def flush(self):
+        payload = self._pending
+        if payload is None:
+            return None
+        return self.emit(payload)
+
+
+class ResultsBatch:
+    """Accumula i nuovi voli e li invia in un solo evento SSE "results" ogni
+    RESULTS_BATCH_SIZE voli o dopo RESULTS_BATCH_MAX_WAIT_SECONDS"""
+    def __init__(self, size=RESULTS_BATCH_SIZE, max_wait=RESULTS_BATCH_MAX_WAIT_SECONDS):
+        self._size = size
+        self._max_wait = max_wait
+        self._pending = []
+        self._last = time.monotonic()
+
+    def add(self, flights, count):
+        # Ritorna l'evento da inviare, oppure None se il lotto non è ancora pronto
+        if not flights:
+            return None
+        self._pending.extend(flights)
+        if (
+            len(self._pending) >= self._size
+            or time.monotonic() - self._last >= self._max_wait
+        ):
+            return self.flush(count)
+        return None
+
+    def flush(self, count):
+        if not self._pending:
+            return None
+        event = sse_event({"type": "results", "flights": self._pending, "count": count})
+        self._pending = []
+        self._last = time.monotonic()
+        return event
 
 
 def search_single_route(
@@ -568,101 +993,80 @@ def search_single_route(
     return_min_arrival_hour=0,
     return_max_arrival_hour=24,
     total_max_price=None,
+    route_claims: RouteClaims | None = None,
 ):
     """
     Esegue una singola ricerca per una rotta origin -> city.
     Ritorna una lista di voli trovati (vuota se nessun risultato).
     Thread-safe - può essere usata con ThreadPoolExecutor.
+    Con route_claims la tratta viene saltata se già richiesta per un'altra città.
     """
     try:
         # Usa la cache per gli aeroporti
         city_airports = _airport_cache.get(scanner, city["skyCode"])
-        if not city_airports:
-            return []
-
-        flight_response = scanner.get_flight_prices(
-            origin=origin,
-            destination=city_airports[0],
-            depart_date=depart_date,
-        )
-
-        if is_round_trip:
-            outbound_flights = []
-            outbound_keys = {}
-            process_flight_response(
-                flight_response,
-                origin,
-                city,
-                depart_date,
-                max_price,
-                min_hour,
-                max_hour,
-                min_arrival_hour,
-                max_arrival_hour,
-                direct_only,
-                same_day,
-                outbound_flights,
-                outbound_keys,
-            )
-            if not outbound_flights:
-                return []
-
-            # Ricerca ritorno
-            return_response = scanner.get_flight_prices(
-                origin=city_airports[0],
-                destination=origin,
-                depart_date=return_date,
-            )
-            return_flights = []
-            return_keys = {}
-            return_city_info = {
-                "name": origin.title,
-                "skyCode": origin.skyId,
-                "country": "",
-            }
-            process_flight_response(
-                return_response,
-                city_airports[0],
-                return_city_info,
-                return_date,
-                return_max_price,
-                return_min_hour,
-                return_max_hour,
-                return_min_arrival_hour,
-                return_max_arrival_hour,
-                direct_only,
-                same_day,
-                return_flights,
-                return_keys,
-            )
-            return attach_return_flights(outbound_flights, return_flights, total_max_price)
-        else:
-            voli_trovati = []
-            voli_keys = {}
-            process_flight_response(
-                flight_response,
-                origin,
-                city,
-                depart_date,
-                max_price,
-                min_hour,
-                max_hour,
-                min_arrival_hour,
-                max_arrival_hour,
-                direct_only,
-                same_day,
-                voli_trovati,
-                voli_keys,
-            )
-            return voli_trovati
-
-    except (AttemptsExhaustedIncompleteResponse, BannedWithCaptcha, GenericError) as e:
+    except BannedWithCaptcha as e:
+        logger.warning(f"Captcha ricerca {origin.skyId} -> {city['skyCode']}: {e}")
+        reset_scanner(scanner)
+        return []
+    except (AttemptsExhaustedIncompleteResponse, GenericError) as e:
         logger.warning(f"Errore ricerca {origin.skyId} -> {city['skyCode']}: {e}")
         return []
     except Exception as e:
         logger.error(f"Errore imprevisto ricerca {origin.skyId} -> {city['skyCode']}: {e}")
         return []
 
+    if not city_airports:
+        return []
+    if route_claims is not None and not route_claims.claim(origin, city_airports[0]):
+        return []
+
+    return search_single_route_direct(
+        scanner,
+        origin,
+        city_airports[0],
+        depart_date,
+        max_price,
+        min_hour,
+        max_hour,
+        min_arrival_hour,
+        max_arrival_hour,
+        direct_only,
+        same_day,
+        is_round_trip,
+        return_date,
+        return_max_price,
+        return_min_hour,
+        return_max_hour,
+        return_min_arrival_hour,
+        return_max_arrival_hour,
+        total_max_price,
+        city_info=city,
+    )
+
+
+def merge_flights(voli_by_key, flights, price_key="prezzo"):
+    """
+    Aggiunge flights a voli_by_key tenendo il più economico per chiave.
+    Ritorna i voli con chiave nuova.
+    """
+    added = []
+    existing_get = voli_by_key.get
+    added_append = added.append
+    for flight in flights:
+        key = (
+            flight["codice_origine"],
+            flight["codice_dest"],
+            flight["partenza"],
+            flight.get("compagnia", "N/A"),
+        )
+        existing = existing_get(key)
+        if existing is None:
+            voli_by_key[key] = flight
+            added_append(flight)
+        elif flight.get(price_key, 0) < existing.get(price_key, 0):
+            voli_by_key[key] = flight
+    return added
+
 
 def search_single_route_direct(
     scanner: SkyScanner,
@@ -684,12 +1088,19 @@ def search_single_route_direct(
     return_min_arrival_hour=0,
     return_max_arrival_hour=24,
     total_max_price=None,
+    city_info=None,
+    raise_errors=False,
 ):
     """
     Esegue una singola ricerca per una rotta origin -> dest (Airport diretto).
     Ritorna una lista di voli trovati (vuota se nessun risultato).
     Thread-safe - può essere usata con ThreadPoolExecutor.
+    city_info descrive la destinazione nei risultati (default: dati di dest).
+    Con raise_errors=True gli errori vengono registrati e poi rilanciati.
     """
+    if city_info is None:
+        city_info = {"name": dest.title, "skyCode": dest.skyId, "country": ""}
+
     try:
         flight_response = scanner.get_flight_prices(
             origin=origin,
@@ -697,11 +1108,8 @@ def search_single_route_direct(
             depart_date=depart_date,
         )
 
-        city_info = {"name": dest.title, "skyCode": dest.skyId, "country": ""}
-
         if is_round_trip:
-            outbound_flights = []
-            outbound_keys = {}
+            outbound_by_key = {}
             process_flight_response(
                 flight_response,
                 origin,
@@ -714,10 +1122,9 @@ def search_single_route_direct(
                 max_arrival_hour,
                 direct_only,
                 same_day,
-                outbound_flights,
-                outbound_keys,
+                outbound_by_key,
             )
-            if not outbound_flights:
+            if not outbound_by_key:
                 return []
 
             # Ricerca ritorno
@@ -726,8 +1133,7 @@ def search_single_route_direct(
                 destination=origin,
                 depart_date=return_date,
             )
-            return_flights = []
-            return_keys = {}
+            return_by_key = {}
             return_city_info = {
                 "name": origin.title,
                 "skyCode": origin.skyId,
@@ -745,13 +1151,15 @@ def search_single_route_direct(
                 return_max_arrival_hour,
                 direct_only,
                 same_day,
-                return_flights,
-                return_keys,
+                return_by_key,
+            )
+            return attach_return_flights(
+                list(outbound_by_key.values()),
+                list(return_by_key.values()),
+                total_max_price,
             )
-            return attach_return_flights(outbound_flights, return_flights, total_max_price)
         else:
-            voli_trovati = []
-            voli_keys = {}
+            voli_by_key = {}
             process_flight_response(
                 flight_response,
                 origin,
@@ -764,16 +1172,25 @@ def search_single_route_direct(
                 max_arrival_hour,
                 direct_only,
                 same_day,
-                voli_trovati,
-                voli_keys,
+                voli_by_key,
             )
-            return voli_trovati
+            return list(voli_by_key.values())
 
-    except (AttemptsExhaustedIncompleteResponse, BannedWithCaptcha, GenericError) as e:
+    except BannedWithCaptcha as e:
+        logger.warning(f"Captcha ricerca {origin.skyId} -> {dest.skyId}: {e}")
+        reset_scanner(scanner)
+        if raise_errors:
+            raise
+        return []
+    except (AttemptsExhaustedIncompleteResponse, GenericError) as e:
         logger.warning(f"Errore ricerca {origin.skyId} -> {dest.skyId}: {e}")
+        if raise_errors:
+            raise
         return []
     except Exception as e:
         logger.error(f"Errore imprevisto ricerca {origin.skyId} -> {dest.skyId}: {e}")
+        if raise_errors:
+            raise
         return []
 
 
@@ -789,7 +1206,7 @@ def api_airports():
         return jsonify([])
 
     scanner = build_scanner()
-    results = scanner.search_airports(query)
+    results = _airport_cache.get(scanner, query)
 
     return jsonify(
         [
@@ -808,10 +1225,8 @@ def api_airports():
 def api_search_stream():
     payload = request.get_json(silent=True) or {}
 
-    origin_items = normalize_selected_locations(payload.get("origins", []))
-    dest_items = normalize_selected_locations(payload.get("destinations", []))
-    origin_codes = dedupe_codes(origin_items)
-    dest_codes = dedupe_codes(dest_items)
+    origin_items, origin_codes = normalize_and_dedupe(payload.get("origins"))
+    dest_items, dest_codes = normalize_and_dedupe(payload.get("destinations"))
     search_everywhere = payload.get("search_everywhere", False) or (
         "EVERYWHERE" in dest_codes or not dest_codes
     )
@@ -875,17 +1290,19 @@ def api_search_stream():
                 400,
             )
     def generate():
-        # Pulisci la cache degli aeroporti per questa ricerca
-        _airport_cache.clear()
         scanner = build_scanner()
+        progress = ProgressThrottle()
+        results = ResultsBatch()
 
         try:
-            origin_list = [airport_from_code(scanner, code) for code in origin_codes]
+            origin_list = airports_from_codes(scanner, origin_codes)
         except GenericError as exc:
             yield sse_event({"type": "error", "error": str(exc)})
             return
+        # Testo per le statistiche finali, uguale per entrambi i rami
+        origin_codes_str = ", ".join(o.skyId for o in origin_list)
 
-        yield sse_event(
+        yield progress.emit(
             {
                 "type": "progress",
                 "message": "Connessione a Skyscanner...",
@@ -901,24 +1318,17 @@ def api_search_stream():
                 item for item in dest_items if item["entity_type"] == "COUNTRY"
             ]
             if country_items:
-                for idx, item in enumerate(country_items, start=1):
-                    title = item.get("title") or item.get("code") or "paese"
-                    yield sse_event(
-                        {
-                            "type": "progress",
-                            "message": f"Espando {title} in città",
-                            "current": idx,
-                            "total": len(country_items),
-                        }
-                    )
+                # Le espansioni girano tutte insieme nel pool: un solo messaggio di fase
+                yield progress.emit(
+                    {
+                        "type": "progress",
+                        "message": f"Espando {len(country_items)} paesi in città",
+                        "current": 0,
+                        "total": len(country_items),
+                    }
+                )
 
-                expanded = []
-                for item in country_items:
-                    expanded.extend(
-                        get_country_places(
-                            scanner, item["code"], item.get("title", "")
-                        )
-                    )
+                expanded = expand_country_places(scanner, country_items)
 
                 expanded_items = [
                     {"code": place["skyCode"], "entity_type": place["type"]}
@@ -940,12 +1350,15 @@ def api_search_stream():
                 return
 
         if search_everywhere:
-            origin_codes_str = [o.skyId for o in origin_list]
-            all_countries = {}
+            seen_countries = set()
+            countries = []
 
             total_origins = len(origin_list)
-            for origin_idx, origin in enumerate(origin_list, start=1):
-                yield sse_event(
+            everywhere_responses = iter_everywhere_responses(
+                scanner, origin_list, depart_date
+            )
+            for origin_idx, (origin, response) in enumerate(everywhere_responses, start=1):
+                event = progress.update(
                     {
                         "type": "progress",
                         "message": f"Cerco paesi da {origin.skyId}",
@@ -953,30 +1366,24 @@ def api_search_stream():
                         "total": total_origins,
                     }
                 )
+                if event:
+                    yield event
+
+                for sky_code, name, entity_id in iter_priced_locations(
+                    response, "everywhereDestination", max_price
+                ):
+                    if sky_code not in seen_countries:
+                        seen_countries.add(sky_code)
+                        countries.append(
+                            {"name": name, "skyCode": sky_code, "entityId": entity_id}
+                        )
 
-                response = scanner.get_flight_prices(
-                    origin=origin,
-                    destination=SpecialTypes.EVERYWHERE,
-                    depart_date=depart_date,
-                )
+            event = progress.flush()
+            if event:
+                yield event
 
-                for r in response.json.get("everywhereDestination", {}).get("results", []):
-                    content = r.get("content", {})
-                    location = content.get("location", {})
-                    price = content.get("flightQuotes", {}).get("cheapest", {}).get(
-                        "rawPrice", 999999
-                    )
-                    if location.get("name") and location.get("skyCode") and price and price <= max_price:
-                        sky_code = location["skyCode"]
-                        if sky_code not in all_countries:
-                            all_countries[sky_code] = {
-                                "name": location["name"],
-                                "skyCode": sky_code,
-                            }
-
-            countries = list(all_countries.values())
             if countries:
-                yield sse_event(
+                yield progress.emit(
                     {
                         "type": "progress",
                         "message": f"Trovati {len(countries)} paesi in budget",
@@ -985,52 +1392,54 @@ def api_search_stream():
                     }
                 )
 
-            all_cities = {}
+            seen_cities = set()
+            cities = []
             first_origin = origin_list[0]
             total_countries = len(countries)
 
-            for country_idx, country in enumerate(countries, start=1):
-                yield sse_event(
-                    {
-                        "type": "progress",
-                        "message": f"Cerco città in {country['name']}",
-                        "current": country_idx,
-                        "total": total_countries,
-                    }
+            # Le ricerche per paese partono tutte insieme; i risultati vengono
+            # consumati nell'ordine originale per mantenere stabile l'output
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                country_responses = executor.map(
+                    lambda country: fetch_country_response(
+                        scanner, first_origin, country, depart_date
+                    ),
+                    countries,
                 )
+                country_results = zip(countries, country_responses)
 
-                country_airports = scanner.search_airports(country["skyCode"])
-                if not country_airports:
-                    continue
-                country_entity = next(
-                    (a for a in country_airports if a.skyId == country["skyCode"]),
-                    country_airports[0],
-                )
+                for country_idx, (country, country_response) in enumerate(
+                    country_results, start=1
+                ):
+                    event = progress.update(
+                        {
+                            "type": "progress",
+                            "message": f"Cerco città in {country['name']}",
+                            "current": country_idx,
+                            "total": total_countries,
+                        }
+                    )
+                    if event:
+                        yield event
 
-                country_response = scanner.get_flight_prices(
-                    origin=first_origin,
-                    destination=country_entity,
-                    depart_date=depart_date,
-                )
+                    if country_response is None:
+                        continue
 
-                for r in country_response.json.get("countryDestination", {}).get("results", []):
-                    content = r.get("content", {})
-                    location = content.get("location", {})
-                    city_price = content.get("flightQuotes", {}).get("cheapest", {}).get(
-                        "rawPrice", 999999
-                    )
-                    if location.get("name") and location.get("skyCode") and city_price and city_price <= max_price:
-                        sky_code = location["skyCode"]
-                        if sky_code not in all_cities:
-                            all_cities[sky_code] = {
-                                "name": location["name"],
-                                "skyCode": sky_code,
-                                "country": country["name"],
-                            }
+                    for sky_code, name, _ in iter_priced_locations(
+                        country_response, "countryDestination", max_price
+                    ):
+                        if sky_code not in seen_cities:
+                            seen_cities.add(sky_code)
+                            cities.append(
+                                {"name": name, "skyCode": sky_code, "country": country["name"]}
+                            )
+
+            event = progress.flush()
+            if event:
+                yield event
 
-            cities = list(all_cities.values())
             if cities:
-                yield sse_event(
+                yield progress.emit(
                     {
                         "type": "progress",
                         "message": f"Trovate {len(cities)} città in budget",
@@ -1039,8 +1448,7 @@ def api_search_stream():
                     }
                 )
 
-            voli_trovati = []
-            voli_keys = {}
+            voli_by_key = {}
             total_searches = len(cities) * len(origin_list)
             search_count = 0
             start_time = time.time()
@@ -1052,7 +1460,7 @@ def api_search_stream():
                 for origin in origin_list
             ]
 
-            yield sse_event(
+            yield progress.emit(
                 {
                     "type": "progress",
                     "message": f"Avvio ricerca parallela ({MAX_WORKERS} thread)...",
@@ -1062,6 +1470,8 @@ def api_search_stream():
                 }
             )
 
+            route_claims = RouteClaims()
+
             # Esegui le ricerche in parallelo
             with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
                 # Sottometti tutti i task
@@ -1087,6 +1497,7 @@ def api_search_stream():
                         return_min_arrival_hour,
                         return_max_arrival_hour,
                         total_max_price,
+                        route_claims,
                     ): (city, origin)
                     for city, origin in search_tasks
                 }
@@ -1097,13 +1508,13 @@ def api_search_stream():
                     elapsed = time.time() - start_time
                     if elapsed > SEARCH_TIMEOUT_SECONDS:
                         logger.warning(f"Timeout globale raggiunto dopo {elapsed:.0f}s")
-                        yield sse_event(
+                        yield progress.emit(
                             {
                                 "type": "progress",
                                 "message": f"Timeout raggiunto, mostro i risultati trovati...",
                                 "current": search_count,
                                 "total": total_searches,
-                                "found": len(voli_trovati),
+                                "found": len(voli_by_key),
                             }
                         )
                         # Cancella i task rimanenti
@@ -1113,74 +1524,52 @@ def api_search_stream():
 
                     city, origin = future_to_route[future]
                     search_count += 1
-                    country_name = city.get("country", "")
-                    detail = f" ({country_name})" if country_name else ""
 
                     try:
                         flights_found = future.result(timeout=1)
-                        before_count = len(voli_trovati)
-
-                        if flights_found:
-                            # Deduplicazione
-                            for flight in flights_found:
-                                carrier_name = flight.get("compagnia", "N/A")
-                                key = (
-                                    f"{flight['codice_origine']}-{flight['codice_dest']}-"
-                                    f"{flight['partenza']}-{carrier_name}"
-                                )
-                                if key in voli_keys:
-                                    existing_idx = voli_keys[key]
-                                    price_key = "prezzo_totale" if is_round_trip else "prezzo"
-                                    if flight.get(price_key, 0) < voli_trovati[existing_idx].get(price_key, 0):
-                                        voli_trovati[existing_idx] = flight
-                                else:
-                                    voli_keys[key] = len(voli_trovati)
-                                    voli_trovati.append(flight)
-
-                        # Manda update di progresso ogni 5 ricerche o quando ci sono nuovi risultati
-                        new_flights = len(voli_trovati) - before_count
-                        if new_flights > 0 or search_count % 5 == 0:
-                            yield sse_event(
-                                {
-                                    "type": "progress",
-                                    "message": f"Completate {search_count}/{total_searches} ricerche",
-                                    "current": search_count,
-                                    "total": total_searches,
-                                    "found": len(voli_trovati),
-                                }
-                            )
+                        new_flights = merge_flights(
+                            voli_by_key,
+                            flights_found,
+                            "prezzo_totale" if is_round_trip else "prezzo",
+                        )
 
-                        if new_flights > 0:
-                            yield sse_event(
-                                {
-                                    "type": "results",
-                                    "flights": voli_trovati[before_count:],
-                                    "count": len(voli_trovati),
-                                }
-                            )
+                        event = progress.update(
+                            search_progress(search_count, total_searches, len(voli_by_key))
+                        )
+                        if event:
+                            yield event
+
+                        event = results.add(new_flights, len(voli_by_key))
+                        if event:
+                            yield event
 
                     except Exception as e:
                         logger.warning(f"Errore task {origin.skyId} -> {city['name']}: {e}")
 
+            event = results.flush(len(voli_by_key))
+            if event:
+                yield event
+            event = progress.flush()
+            if event:
+                yield event
+
             stats = {
                 "paesi": len(countries),
                 "città": len(cities),
-                "partenze": ", ".join(origin_codes_str),
+                "partenze": origin_codes_str,
             }
-            flights = sort_flights(voli_trovati, sort_key)
+            flights = sort_flights(list(voli_by_key.values()), sort_key)
 
         else:
             try:
-                dest_list = [airport_from_code(scanner, code) for code in dest_codes]
+                dest_list = airports_from_codes(scanner, dest_codes)
             except GenericError as exc:
                 yield sse_event({"type": "error", "error": str(exc)})
                 return
 
-            origin_codes_str = [o.skyId for o in origin_list]
-            dest_codes_str = [d.skyId for d in dest_list]
+            dest_codes_str = ", ".join(d.skyId for d in dest_list)
 
-            voli_trovati = []
-            voli_keys = {}
+            voli_by_key = {}
             total_searches = len(origin_list) * len(dest_list)
             search_count = 0
             start_time = time.time()
@@ -1192,7 +1581,7 @@ def api_search_stream():
                 for dest in dest_list
             ]
 
-            yield sse_event(
+            yield progress.emit(
                 {
                     "type": "progress",
                     "message": f"Avvio ricerca parallela ({MAX_WORKERS} thread)...",
@@ -1237,13 +1626,13 @@ def api_search_stream():
                     elapsed = time.time() - start_time
                     if elapsed > SEARCH_TIMEOUT_SECONDS:
                         logger.warning(f"Timeout globale raggiunto dopo {elapsed:.0f}s")
-                        yield sse_event(
+                        yield progress.emit(
                             {
                                 "type": "progress",
                                 "message": f"Timeout raggiunto, mostro i risultati trovati...",
                                 "current": search_count,
                                 "total": total_searches,
-                                "found": len(voli_trovati),
+                                "found": len(voli_by_key),
                             }
                         )
                         # Cancella i task rimanenti
@@ -1256,55 +1645,37 @@ def api_search_stream():
 
                     try:
                         flights_found = future.result(timeout=1)
-                        before_count = len(voli_trovati)
-
-                        if flights_found:
-                            # Deduplicazione
-                            for flight in flights_found:
-                                carrier_name = flight.get("compagnia", "N/A")
-                                key = (
-                                    f"{flight['codice_origine']}-{flight['codice_dest']}-"
-                                    f"{flight['partenza']}-{carrier_name}"
-                                )
-                                if key in voli_keys:
-                                    existing_idx = voli_keys[key]
-                                    price_key = "prezzo_totale" if is_round_trip else "prezzo"
-                                    if flight.get(price_key, 0) < voli_trovati[existing_idx].get(price_key, 0):
-                                        voli_trovati[existing_idx] = flight
-                                else:
-                                    voli_keys[key] = len(voli_trovati)
-                                    voli_trovati.append(flight)
-
-                        # Manda update di progresso ogni 5 ricerche o quando ci sono nuovi risultati
-                        new_flights = len(voli_trovati) - before_count
-                        if new_flights > 0 or search_count % 5 == 0:
-                            yield sse_event(
-                                {
-                                    "type": "progress",
-                                    "message": f"Completate {search_count}/{total_searches} ricerche",
-                                    "current": search_count,
-                                    "total": total_searches,
-                                    "found": len(voli_trovati),
-                                }
-                            )
+                        new_flights = merge_flights(
+                            voli_by_key,
+                            flights_found,
+                            "prezzo_totale" if is_round_trip else "prezzo",
+                        )
 
-                        if new_flights > 0:
-                            yield sse_event(
-                                {
-                                    "type": "results",
-                                    "flights": voli_trovati[before_count:],
-                                    "count": len(voli_trovati),
-                                }
-                            )
+                        event = progress.update(
+                            search_progress(search_count, total_searches, len(voli_by_key))
+                        )
+                        if event:
+                            yield event
+
+                        event = results.add(new_flights, len(voli_by_key))
+                        if event:
+                            yield event
 
                     except Exception as e:
                         logger.warning(f"Errore task {origin.skyId} -> {dest.title}: {e}")
 
+            event = results.flush(len(voli_by_key))
+            if event:
+                yield event
+            event = progress.flush()
+            if event:
+                yield event
+
             stats = {
-                "partenze": ", ".join(origin_codes_str),
-                "destinazioni": ", ".join(dest_codes_str),
+                "partenze": origin_codes_str,
+                "destinazioni": dest_codes_str,
             }
-            flights = sort_flights(voli_trovati, sort_key)
+            flights = sort_flights(list(voli_by_key.values()), sort_key)
 
         yield sse_event(
             {
@@ -1330,10 +1701,8 @@ def api_search_stream():
 def api_search():
     payload = request.get_json(silent=True) or {}
 
-    origin_items = normalize_selected_locations(payload.get("origins", []))
-    dest_items = normalize_selected_locations(payload.get("destinations", []))
-    origin_codes = dedupe_codes(origin_items)
-    dest_codes = dedupe_codes(dest_items)
+    origin_items, origin_codes = normalize_and_dedupe(payload.get("origins"))
+    dest_items, dest_codes = normalize_and_dedupe(payload.get("destinations"))
     search_everywhere = payload.get("search_everywhere", False) or (
         "EVERYWHERE" in dest_codes or not dest_codes
     )
@@ -1409,7 +1778,7 @@ def api_search():
     scanner = build_scanner()
 
     try:
-        origin_list = [airport_from_code(scanner, code) for code in origin_codes]
+        origin_list = airports_from_codes(scanner, origin_codes)
     except GenericError as exc:
         return jsonify({"error": str(exc)}), 400
 
@@ -1418,13 +1787,7 @@ def api_search():
             item for item in dest_items if item["entity_type"] == "COUNTRY"
         ]
         if country_items:
-            expanded = []
-            for item in country_items:
-                expanded.extend(
-                    get_country_places(
-                        scanner, item["code"], item.get("title", "")
-                    )
-                )
+            expanded = expand_country_places(scanner, country_items)
 
             expanded_items = [
                 {"code": place["skyCode"], "entity_type": place["type"]}
@@ -1447,151 +1810,21 @@ def api_search():
             )
 
     if search_everywhere:
-        if is_round_trip:
-            flights = []
-            origin_codes_str = [o.skyId for o in origin_list]
-            all_countries = {}
-
-            for origin in origin_list:
-                response = scanner.get_flight_prices(
-                    origin=origin,
-                    destination=SpecialTypes.EVERYWHERE,
-                    depart_date=depart_date,
-                )
-
-                for r in response.json.get("everywhereDestination", {}).get("results", []):
-                    content = r.get("content", {})
-                    location = content.get("location", {})
-                    price = content.get("flightQuotes", {}).get("cheapest", {}).get(
-                        "rawPrice", 999999
-                    )
-                    if location.get("name") and location.get("skyCode") and price and price <= max_price:
-                        sky_code = location["skyCode"]
-                        if sky_code not in all_countries:
-                            all_countries[sky_code] = {
-                                "name": location["name"],
-                                "skyCode": sky_code,
-                            }
-
-            countries = list(all_countries.values())
-
-            all_cities = {}
-            first_origin = origin_list[0]
-
-            for country in countries:
-                country_airports = scanner.search_airports(country["skyCode"])
-                if not country_airports:
-                    continue
-                country_entity = next(
-                    (a for a in country_airports if a.skyId == country["skyCode"]),
-                    country_airports[0],
-                )
-
-                country_response = scanner.get_flight_prices(
-                    origin=first_origin,
-                    destination=country_entity,
-                    depart_date=depart_date,
-                )
-
-                for r in country_response.json.get("countryDestination", {}).get("results", []):
-                    content = r.get("content", {})
-                    location = content.get("location", {})
-                    city_price = content.get("flightQuotes", {}).get("cheapest", {}).get(
-                        "rawPrice", 999999
-                    )
-                    if location.get("name") and location.get("skyCode") and city_price and city_price <= max_price:
-                        sky_code = location["skyCode"]
-                        if sky_code not in all_cities:
-                            all_cities[sky_code] = {
-                                "name": location["name"],
-                                "skyCode": sky_code,
-                                "country": country["name"],
-                            }
-
-            cities = list(all_cities.values())
-            stats = {
-                "paesi": len(countries),
-                "città": len(cities),
-                "partenze": ", ".join(origin_codes_str),
-            }
-
-            for city in cities:
-                for origin in origin_list:
-                    city_airports = scanner.search_airports(city["skyCode"])
-                    if not city_airports:
-                        continue
-                    flight_response = scanner.get_flight_prices(
-                        origin=origin,
-                        destination=city_airports[0],
-                        depart_date=depart_date,
-                    )
-                    outbound_flights = []
-                    outbound_keys = {}
-                    process_flight_response(
-                        flight_response,
-                        origin,
-                        city,
-                        depart_date,
-                        max_price,
-                        min_hour,
-                        max_hour,
-                        min_arrival_hour,
-                        max_arrival_hour,
-                        direct_only,
-                        same_day,
-                        outbound_flights,
-                        outbound_keys,
-                    )
-                    if not outbound_flights:
-                        continue
-                    return_response = scanner.get_flight_prices(
-                        origin=city_airports[0],
-                        destination=origin,
-                        depart_date=return_date,
-                    )
-                    return_flights = []
-                    return_keys = {}
-                    return_city_info = {
-                        "name": origin.title,
-                        "skyCode": origin.skyId,
-                        "country": "",
-                    }
-                    process_flight_response(
-                        return_response,
-                        city_airports[0],
-                        return_city_info,
-                        return_date,
-                        return_max_price,
-                        return_min_hour,
-                        return_max_hour,
-                        return_min_arrival_hour,
-                        return_max_arrival_hour,
-                        direct_only,
-                        same_day,
-                        return_flights,
-                        return_keys,
-                    )
-                    flights.extend(
-                        attach_return_flights(
-                            outbound_flights, return_flights, total_max_price
-                        )
-                    )
-        else:
-            flights, stats = search_everywhere_multi(
-                scanner,
-                origin_list,
-                depart_date,
-                max_price,
-                min_hour,
-                max_hour,
-                min_arrival_hour,
-                max_arrival_hour,
-                direct_only,
-                same_day,
-            )
+        flights, stats = search_everywhere_multi(
+            scanner,
+            origin_list,
+            depart_date,
+            max_price,
+            min_hour,
+            max_hour,
+            min_arrival_hour,
+            max_arrival_hour,
+            direct_only,
+            same_day,
+        )
     else:
         try:
-            dest_list = [airport_from_code(scanner, code) for code in dest_codes]
+            dest_list = airports_from_codes(scanner, dest_codes)
         except GenericError as exc:
             return jsonify({"error": str(exc)}), 400
 
@@ -1601,22 +1834,13 @@ def api_search():
                 "partenze": ", ".join([o.skyId for o in origin_list]),
                 "destinazioni": ", ".join([d.skyId for d in dest_list]),
             }
-            for origin in origin_list:
-                for dest in dest_list:
-                    flight_response = scanner.get_flight_prices(
-                        origin=origin, destination=dest, depart_date=depart_date
-                    )
-                    city_info = {
-                        "name": dest.title,
-                        "skyCode": dest.skyId,
-                        "country": "",
-                    }
-                    outbound_flights = []
-                    outbound_keys = {}
-                    process_flight_response(
-                        flight_response,
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                route_futures = [
+                    executor.submit(
+                        search_single_route_direct,
+                        scanner,
                         origin,
-                        city_info,
+                        dest,
                         depart_date,
                         max_price,
                         min_hour,
@@ -1625,41 +1849,27 @@ def api_search():
                         max_arrival_hour,
                         direct_only,
                         same_day,
-                        outbound_flights,
-                        outbound_keys,
-                    )
-                    if not outbound_flights:
-                        continue
-                    return_response = scanner.get_flight_prices(
-                        origin=dest, destination=origin, depart_date=return_date
-                    )
-                    return_flights = []
-                    return_keys = {}
-                    return_city_info = {
-                        "name": origin.title,
-                        "skyCode": origin.skyId,
-                        "country": "",
-                    }
-                    process_flight_response(
-                        return_response,
-                        dest,
-                        return_city_info,
+                        True,
                         return_date,
                         return_max_price,
                         return_min_hour,
                         return_max_hour,
                         return_min_arrival_hour,
                         return_max_arrival_hour,
-                        direct_only,
-                        same_day,
-                        return_flights,
-                        return_keys,
-                    )
-                    flights.extend(
-                        attach_return_flights(
-                            outbound_flights, return_flights, total_max_price
-                        )
+                        total_max_price,
+                        raise_errors=True,
                     )
+                    for origin in origin_list
+                    for dest in dest_list
+                ]
+                try:
+                    for future in route_futures:
+                        flights.extend(future.result())
+                except Exception:
+                    # Come nella ricerca sequenziale il primo errore arriva al client:
+                    # le rotte ancora in coda non partono
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
         else:
             flights, stats = search_specific_destinations(
                 scanner,
@@ -1677,14 +1887,19 @@ def api_search():
 
     flights = sort_flights(flights, sort_key)
 
-    return jsonify(
-        {
-            "flights": flights,
-            "stats": stats,
-            "count": len(flights),
-            "search_everywhere": search_everywhere,
-        }
+    # orjson serializza le centinaia di voli molto più velocemente di jsonify
+    return Response(
+        orjson.dumps(
+            {
+                "flights": flights,
+                "stats": stats,
+                "count": len(flights),
+                "search_everywhere": search_everywhere,
+            }
+        ),
+        mimetype="application/json",
     )
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Solo sviluppo: in produzione usare `gunicorn app:app` (vedi gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=5000, debug=True, threaded=True)
@@ -1,10 +1,39 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+import re
 import threading
+import zlib
+import bisect
 import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from operator import itemgetter
+from curl_cffi.requests.exceptions import RequestException
 from skyscanner import SkyScanner
+from skyscanner.errors import AttemptsExhaustedIncompleteResponse, BannedWithCaptcha, GenericError
 from skyscanner.types import SpecialTypes, Airport
 
+# Chiamate HTTP a Skyscanner in parallelo (paesi, città e ricerche voli)
+MAX_WORKERS = 8
+# Ricerca "Ovunque": raggiunti questi voli le ricerche città ancora in coda si annullano
+MAX_RESULTS = 200
+# Card dei risultati costruite per volta: le successive solo scorrendo in fondo
+CARDS_PAGE_SIZE = 30
+# Intervallo di aggiornamento di etichette e barra di avanzamento (~30 Hz)
+UI_FLUSH_MS = 33
+# Errori attesi di una singola ricerca: la saltano senza fermare le altre
+SEARCH_ERRORS = (AttemptsExhaustedIncompleteResponse, BannedWithCaptcha, GenericError,
+                 RequestException, ValueError)
+# Una risposta con struttura inattesa scarta solo quella rotta
+RESPONSE_ERRORS = SEARCH_ERRORS + (KeyError, TypeError)
+
+# Chiavi di ordinamento dei risultati, una per ogni radio button "Ordina per"
+SORT_KEYS = {
+    "prezzo": itemgetter("prezzo"),
+    "orario": itemgetter("partenza"),
+    "durata": itemgetter("durata_min"),
+}
+
 
 class AirportSearchWidget(ttk.Frame):
     """
@@ -221,7 +250,8 @@ class AirportSearchWidget(ttk.Frame):
             focused = self.winfo_toplevel().focus_get()
             if focused not in (self.search_entry, self.dropdown_listbox):
                 self._hide_dropdown(None)
-        except:
+        except (KeyError, tk.TclError):
+            # focus_get() fallisce se il focus è nel popup di una combobox
             pass
 
     def _hide_dropdown(self, event):
@@ -426,95 +456,154 @@ class ModernLightStyle:
     WARNING = "#f59e0b"
     ACCENT_LIGHT = "#e8f0fe"
 
+    # Stili ttk applicati in un solo ciclo da configure_styles
+    _WHITE_DARK = {"background": BG_WHITE, "foreground": TEXT_DARK}
+    _WHITE_SECONDARY = {"background": BG_WHITE, "foreground": TEXT_SECONDARY}
+    STYLES = {
+        # Frames
+        "Main.TFrame": {"background": BG_MAIN},
+        "Card.TFrame": {"background": BG_WHITE},
+        "White.TFrame": {"background": BG_WHITE},
+        # Labels
+        "Title.TLabel": {**_WHITE_DARK, "font": ("Segoe UI", 20, "bold")},
+        "Subtitle.TLabel": {**_WHITE_SECONDARY, "font": ("Segoe UI", 10)},
+        "Card.TLabel": {**_WHITE_DARK, "font": ("Segoe UI", 10)},
+        "CardSmall.TLabel": {**_WHITE_SECONDARY, "font": ("Segoe UI", 9)},
+        "Status.TLabel": {"background": BG_MAIN, "foreground": PRIMARY,
+                          "font": ("Segoe UI", 10, "bold")},
+        "Step.TLabel": {"background": BG_MAIN, "foreground": TEXT_SECONDARY,
+                        "font": ("Segoe UI", 9)},
+        "Price.TLabel": {"background": BG_WHITE, "foreground": PRIMARY,
+                         "font": ("Segoe UI", 16, "bold")},
+        "Airline.TLabel": {**_WHITE_DARK, "font": ("Segoe UI", 11, "bold")},
+        "Time.TLabel": {**_WHITE_DARK, "font": ("Segoe UI", 14, "bold")},
+        "Duration.TLabel": {**_WHITE_SECONDARY, "font": ("Segoe UI", 9)},
+        "FilterLabel.TLabel": {**_WHITE_SECONDARY, "font": ("Segoe UI", 9)},
+        # Progress bar
+        "Primary.Horizontal.TProgressbar": {"background": PRIMARY, "troughcolor": BORDER,
+                                            "borderwidth": 0},
+        # Combobox
+        "TCombobox": {**_WHITE_DARK, "fieldbackground": BG_WHITE, "arrowcolor": PRIMARY,
+                      "borderwidth": 1, "relief": "solid"},
+        # Checkbutton
+        "Filter.TCheckbutton": {**_WHITE_DARK, "font": ("Segoe UI", 9)},
+    }
+
     @classmethod
     def configure_styles(cls):
         style = ttk.Style()
         style.theme_use('clam')
 
-        # Frames
-        style.configure("Main.TFrame", background=cls.BG_MAIN)
-        style.configure("Card.TFrame", background=cls.BG_WHITE)
-        style.configure("White.TFrame", background=cls.BG_WHITE)
-
-        # Labels
-        style.configure("Title.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_DARK,
-                       font=("Segoe UI", 20, "bold"))
-        style.configure("Subtitle.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_SECONDARY,
-                       font=("Segoe UI", 10))
-        style.configure("Card.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_DARK,
-                       font=("Segoe UI", 10))
-        style.configure("CardSmall.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_SECONDARY,
-                       font=("Segoe UI", 9))
-        style.configure("Status.TLabel",
-                       background=cls.BG_MAIN,
-                       foreground=cls.PRIMARY,
-                       font=("Segoe UI", 10, "bold"))
-        style.configure("Step.TLabel",
-                       background=cls.BG_MAIN,
-                       foreground=cls.TEXT_SECONDARY,
-                       font=("Segoe UI", 9))
-        style.configure("Price.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.PRIMARY,
-                       font=("Segoe UI", 16, "bold"))
-        style.configure("Airline.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_DARK,
-                       font=("Segoe UI", 11, "bold"))
-        style.configure("Time.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_DARK,
-                       font=("Segoe UI", 14, "bold"))
-        style.configure("Duration.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_SECONDARY,
-                       font=("Segoe UI", 9))
-        style.configure("FilterLabel.TLabel",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_SECONDARY,
-                       font=("Segoe UI", 9))
-
-        # Progress bar
-        style.configure("Primary.Horizontal.TProgressbar",
-                       background=cls.PRIMARY,
-                       troughcolor=cls.BORDER,
-                       borderwidth=0)
+        for name, options in cls.STYLES.items():
+            style.configure(name, **options)
 
-        # Combobox
-        style.configure("TCombobox",
-                       fieldbackground=cls.BG_WHITE,
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_DARK,
-                       arrowcolor=cls.PRIMARY,
-                       borderwidth=1,
-                       relief="solid")
+        # Combobox: colori nello stato readonly
         style.map("TCombobox",
                  fieldbackground=[('readonly', cls.BG_WHITE)],
                  selectbackground=[('readonly', cls.ACCENT_LIGHT)],
                  selectforeground=[('readonly', cls.TEXT_DARK)])
 
-        # Checkbutton
-        style.configure("Filter.TCheckbutton",
-                       background=cls.BG_WHITE,
-                       foreground=cls.TEXT_DARK,
-                       font=("Segoe UI", 9))
+
+AIRLINE_COLORS = ("#1a4fd6", "#e94560", "#10b981", "#f59e0b", "#8b5cf6", "#06b6d4")
+
+
+@lru_cache(maxsize=512)
+def _airline_color(name):
+    # Le compagnie si ripetono molto tra le card: calcolo una volta per nome.
+    # crc32 invece di hash(): stesso colore per la stessa compagnia a ogni avvio
+    return AIRLINE_COLORS[zlib.crc32(name.encode("utf-8")) % len(AIRLINE_COLORS)]
+
+
+@lru_cache(maxsize=512)
+def _airline_initials(name):
+    words = name.split()
+    if len(words) >= 2:
+        return (words[0][0] + words[1][0]).upper()
+    return name[:2].upper()
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso(value):
+    """datetime di una stringa ISO degli itinerari, None se vuota o non valida."""
+    # Gli stessi orari di scalo si ripetono tra itinerari: cache sulla stringa
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+# GG/MM/AAAA, con giorno e mese anche a una cifra come accettava strptime
+_DATE_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+
+
+def _parse_date(date_str):
+    match = _DATE_RE.fullmatch(date_str.strip())
+    if match is None:
+        raise ValueError(f"Data non valida: {date_str!r}")
+    day, month, year = match.groups()
+    return datetime.datetime(int(year), int(month), int(day))
+
+
+def _iter_priced_locations(response, results_key, max_price):
+    """Coppie (skyCode, nome) dei risultati EVERYWHERE/paese con prezzo entro max_price."""
+    payload = response.json
+    for r in payload.get(results_key, {}).get("results", ()):
+        # Accesso diretto: i campi mancano solo nei risultati incompleti
+        try:
+            content = r["content"]
+            location = content["location"]
+            name = location["name"]
+            sky_code = location["skyCode"]
+        except (KeyError, TypeError):
+            continue
+        if not name or not sky_code:
+            continue
+        try:
+            price = content["flightQuotes"]["cheapest"]["rawPrice"]
+        except (KeyError, TypeError):
+            price = 999999
+        if price and price <= max_price:
+            yield sky_code, name
+
+
+@lru_cache(maxsize=None)
+def _blank_image():
+    # Immagine 1x1 condivisa da tutti i loghi (creata dopo tk.Tk())
+    return tk.PhotoImage(width=1, height=1)
+
+
+def _stop_line(stop):
+    """Testo di una riga scalo della card (es. "Scalo a Roma (FCO): arrivo 10:00 ...")."""
+    text = f"Scalo a {stop['città']}"
+    if stop['codice']:
+        text += f" ({stop['codice']})"
+    text += f": arrivo {stop['arrivo']}"
+    if stop['partenza']:
+        text += f" → ripartenza {stop['partenza']}"
+    if stop['attesa']:
+        text += f" (attesa {stop['attesa']})"
+    return text
+
+
+# Opzioni dei widget delle card, condivise da tutte le istanze
+FONT_SMALL = ("Segoe UI", 9)
+LOGO_KW = dict(width=50, height=50, bd=0, fg="white", font=("Segoe UI", 12, "bold"))
+STOP_ICON_KW = dict(text="✈", font=FONT_SMALL, bg="white", fg=ModernLightStyle.WARNING)
+STOP_TEXT_KW = dict(font=FONT_SMALL, bg="white", fg=ModernLightStyle.TEXT_SECONDARY)
+LINE_CANVAS_KW = dict(height=20, bg="white", highlightthickness=0)
+STOP_DOT_KW = dict(fill=ModernLightStyle.WARNING, outline="")
+END_DOT_KW = dict(fill=ModernLightStyle.PRIMARY, outline="")
 
 
 class FlightCard(ttk.Frame):
     """A single flight result card"""
-    def __init__(self, parent, flight_data, **kwargs):
+    def __init__(self, parent, flight_data=None, **kwargs):
         super().__init__(parent, style="Card.TFrame", **kwargs)
 
         self.configure(padding=15)
-        self.flight_data = flight_data
+        self.flight_data = None
 
         # Main container (vertical)
         main_container = ttk.Frame(self, style="White.TFrame")
@@ -530,17 +619,14 @@ class FlightCard(ttk.Frame):
         airline_frame.pack_propagate(False)
 
         # Airline logo placeholder (colored box with initials)
-        logo_frame = tk.Frame(airline_frame, bg=self._get_airline_color(flight_data["compagnia"]),
-                             width=50, height=50)
-        logo_frame.pack(pady=(0, 5))
-        logo_frame.pack_propagate(False)
+        # Un solo Label 50x50 px: l'immagine vuota condivisa fa misurare
+        # width/height in pixel, senza Frame contenitore
+        self.logo_label = tk.Label(airline_frame, image=_blank_image(), compound="center",
+                                   **LOGO_KW)
+        self.logo_label.pack(pady=(0, 5))
 
-        initials = self._get_initials(flight_data["compagnia"])
-        tk.Label(logo_frame, text=initials, bg=self._get_airline_color(flight_data["compagnia"]),
-                fg="white", font=("Segoe UI", 12, "bold")).place(relx=0.5, rely=0.5, anchor="center")
-
-        ttk.Label(airline_frame, text=flight_data["compagnia"][:15],
-                 style="CardSmall.TLabel").pack()
+        self.airline_label = ttk.Label(airline_frame, style="CardSmall.TLabel")
+        self.airline_label.pack()
 
         # Center: Times and duration
         times_frame = ttk.Frame(top_row, style="White.TFrame")
@@ -549,102 +635,144 @@ class FlightCard(ttk.Frame):
         # Departure
         dep_frame = ttk.Frame(times_frame, style="White.TFrame")
         dep_frame.pack(side="left")
-        ttk.Label(dep_frame, text=flight_data["partenza"], style="Time.TLabel").pack()
-        ttk.Label(dep_frame, text=flight_data.get("codice_origine", "???"), style="CardSmall.TLabel").pack()
+        self.dep_time_label = ttk.Label(dep_frame, style="Time.TLabel")
+        self.dep_time_label.pack()
+        self.dep_code_label = ttk.Label(dep_frame, style="CardSmall.TLabel")
+        self.dep_code_label.pack()
 
         # Duration line
         duration_frame = ttk.Frame(times_frame, style="White.TFrame")
         duration_frame.pack(side="left", expand=True, fill="x", padx=20)
 
-        ttk.Label(duration_frame, text=flight_data["durata"], style="Duration.TLabel").pack()
+        self.duration_label = ttk.Label(duration_frame, style="Duration.TLabel")
+        self.duration_label.pack()
 
         # Draw line with dots
-        line_canvas = tk.Canvas(duration_frame, height=20, bg="white", highlightthickness=0)
-        line_canvas.pack(fill="x", pady=2)
-        line_canvas.bind("<Configure>", lambda e: self._draw_flight_line(line_canvas, flight_data["scali"]))
+        self.line_canvas = tk.Canvas(duration_frame, **LINE_CANVAS_KW)
+        self.line_canvas.pack(fill="x", pady=2)
+        self._create_flight_line(self.line_canvas)
+        self.line_canvas.bind("<Configure>",
+                              lambda e: self._layout_flight_line(self.line_canvas, e.width, e.height))
 
-        stops_text = "Diretto" if flight_data["scali"] == 0 else f"{flight_data['scali']} scalo"
-        ttk.Label(duration_frame, text=stops_text, style="Duration.TLabel").pack()
+        self.stops_label = ttk.Label(duration_frame, style="Duration.TLabel")
+        self.stops_label.pack()
 
         # Arrival
         arr_frame = ttk.Frame(times_frame, style="White.TFrame")
         arr_frame.pack(side="left")
-        ttk.Label(arr_frame, text=flight_data["arrivo"], style="Time.TLabel").pack()
-        ttk.Label(arr_frame, text=flight_data["codice_dest"], style="CardSmall.TLabel").pack()
+        self.arr_time_label = ttk.Label(arr_frame, style="Time.TLabel")
+        self.arr_time_label.pack()
+        self.arr_code_label = ttk.Label(arr_frame, style="CardSmall.TLabel")
+        self.arr_code_label.pack()
 
         # Right: Price and destination
         price_frame = ttk.Frame(top_row, style="White.TFrame", width=150)
         price_frame.pack(side="right", padx=(20, 0))
         price_frame.pack_propagate(False)
 
-        ttk.Label(price_frame, text=f"€ {flight_data['prezzo']:.0f}",
-                 style="Price.TLabel").pack(anchor="e")
-        ttk.Label(price_frame, text=flight_data["città"],
-                 style="Card.TLabel").pack(anchor="e")
-        ttk.Label(price_frame, text=flight_data["paese"],
-                 style="CardSmall.TLabel").pack(anchor="e")
-
-        # Bottom row: Stopover details (if any)
-        stopovers = flight_data.get("stopovers", [])
-        if stopovers:
-            # Separator line
-            separator = ttk.Frame(main_container, style="White.TFrame", height=1)
-            separator.pack(fill="x", pady=(10, 5))
-            tk.Frame(separator, bg="#e1e5eb", height=1).pack(fill="x")
-
-            # Stopover info
-            stopover_frame = ttk.Frame(main_container, style="White.TFrame")
-            stopover_frame.pack(fill="x", padx=(100, 0))  # Align with times
-
-            for i, stop in enumerate(stopovers):
-                stop_row = ttk.Frame(stopover_frame, style="White.TFrame")
+        self.price_label = ttk.Label(price_frame, style="Price.TLabel")
+        self.price_label.pack(anchor="e")
+        self.city_label = ttk.Label(price_frame, style="Card.TLabel")
+        self.city_label.pack(anchor="e")
+        self.country_label = ttk.Label(price_frame, style="CardSmall.TLabel")
+        self.country_label.pack(anchor="e")
+
+        # Bottom row: Stopover details, mostrata solo se ci sono scali
+        self.separator = ttk.Frame(main_container, style="White.TFrame", height=1)
+        tk.Frame(self.separator, bg=ModernLightStyle.BORDER, height=1).pack(fill="x")
+        self.stopover_frame = ttk.Frame(main_container, style="White.TFrame")
+        # Righe (frame, label testo) riusate tra un volo e l'altro
+        self.stop_rows = []
+
+        if flight_data is not None:
+            self.update_data(flight_data)
+
+    def update_data(self, flight_data):
+        """Mostra un altro volo riconfigurando i widget esistenti (card riciclate dal pool)"""
+        self.flight_data = flight_data
+
+        compagnia = flight_data["compagnia"]
+        self.logo_label.configure(text=_airline_initials(compagnia), bg=_airline_color(compagnia))
+        self.airline_label.configure(text=flight_data["airline_short"])
+
+        self.dep_time_label.configure(text=flight_data["partenza"])
+        self.dep_code_label.configure(text=flight_data.get("codice_origine", "???"))
+        self.duration_label.configure(text=flight_data["durata"])
+        self.stops_label.configure(text=flight_data["stops_text"])
+        self.arr_time_label.configure(text=flight_data["arrivo"])
+        self.arr_code_label.configure(text=flight_data["codice_dest"])
+
+        self.price_label.configure(text=flight_data["price_text"])
+        self.city_label.configure(text=flight_data["città"])
+        self.country_label.configure(text=flight_data["paese"])
+
+        self._set_stop_dots(self.line_canvas, flight_data["scali"])
+        self._set_stop_lines(flight_data["stop_lines"])
+
+    def _set_stop_lines(self, stop_lines):
+        if not stop_lines:
+            self.separator.pack_forget()
+            self.stopover_frame.pack_forget()
+            return
+
+        # Separator line
+        self.separator.pack(fill="x", pady=(10, 5))
+        # Stopover info
+        self.stopover_frame.pack(fill="x", padx=(100, 0))  # Align with times
+
+        while len(self.stop_rows) < len(stop_lines):
+            stop_row = ttk.Frame(self.stopover_frame, style="White.TFrame")
+
+            # Stop icon
+            tk.Label(stop_row, **STOP_ICON_KW).pack(side="left", padx=(0, 5))
+
+            # Stop info text (già formattato nel thread di ricerca)
+            text_label = tk.Label(stop_row, **STOP_TEXT_KW)
+            text_label.pack(side="left")
+            self.stop_rows.append((stop_row, text_label))
+
+        for i, (stop_row, text_label) in enumerate(self.stop_rows):
+            if i < len(stop_lines):
+                text_label.configure(text=stop_lines[i])
                 stop_row.pack(fill="x", pady=2)
+            else:
+                stop_row.pack_forget()
+
+    def _create_flight_line(self, canvas):
+        # Elementi creati una volta sola: ai ridimensionamenti si spostano con coords()
+        self._line_id = canvas.create_line(0, 0, 0, 0, fill=ModernLightStyle.BORDER, width=2)
+        self._stop_ids = []
+        self._start_id = canvas.create_oval(0, 0, 0, 0, **END_DOT_KW)
+        self._end_id = canvas.create_oval(0, 0, 0, 0, **END_DOT_KW)
 
-                # Stop icon
-                tk.Label(stop_row, text="✈", font=("Segoe UI", 9),
-                        bg="white", fg="#f59e0b").pack(side="left", padx=(0, 5))
-
-                # Stop info text
-                stop_text = f"Scalo a {stop['città']}"
-                if stop['codice']:
-                    stop_text += f" ({stop['codice']})"
-                stop_text += f": arrivo {stop['arrivo']}"
-                if stop['partenza']:
-                    stop_text += f" → ripartenza {stop['partenza']}"
-                if stop['attesa']:
-                    stop_text += f" (attesa {stop['attesa']})"
-
-                tk.Label(stop_row, text=stop_text, font=("Segoe UI", 9),
-                        bg="white", fg="#6b7280").pack(side="left")
-
-    def _get_initials(self, name):
-        words = name.split()
-        if len(words) >= 2:
-            return (words[0][0] + words[1][0]).upper()
-        return name[:2].upper()
-
-    def _get_airline_color(self, name):
-        colors = ["#1a4fd6", "#e94560", "#10b981", "#f59e0b", "#8b5cf6", "#06b6d4"]
-        return colors[hash(name) % len(colors)]
-
-    def _draw_flight_line(self, canvas, stops):
-        canvas.delete("all")
-        w = canvas.winfo_width()
-        h = canvas.winfo_height()
+    def _set_stop_dots(self, canvas, stops):
+        if len(self._stop_ids) == stops:
+            return
+        canvas.delete(*self._stop_ids)
+        self._stop_ids = [
+            canvas.create_oval(0, 0, 0, 0, **STOP_DOT_KW)
+            for _ in range(stops)
+        ]
+        # Card riciclata già visibile: <Configure> non scatta, riposiziono qui
+        w, h = canvas.winfo_width(), canvas.winfo_height()
+        if w > 1:
+            self._layout_flight_line(canvas, w, h)
+
+    def _layout_flight_line(self, canvas, w, h):
         y = h // 2
 
-        # Draw line
-        canvas.create_line(10, y, w-10, y, fill="#e1e5eb", width=2)
+        # Line
+        canvas.coords(self._line_id, 10, y, w - 10, y)
 
-        # Draw dots for stops
-        if stops > 0:
-            for i in range(stops):
-                x = 10 + (i + 1) * (w - 20) / (stops + 1)
-                canvas.create_oval(x-4, y-4, x+4, y+4, fill="#f59e0b", outline="")
+        # Dots for stops
+        stops = len(self._stop_ids)
+        for i, item in enumerate(self._stop_ids):
+            x = 10 + (i + 1) * (w - 20) // (stops + 1)
+            canvas.coords(item, x - 4, y - 4, x + 4, y + 4)
 
         # Endpoints
-        canvas.create_oval(6, y-4, 14, y+4, fill="#1a4fd6", outline="")
-        canvas.create_oval(w-14, y-4, w-6, y+4, fill="#1a4fd6", outline="")
+        canvas.coords(self._start_id, 6, y - 4, 14, y + 4)
+        canvas.coords(self._end_id, w - 14, y - 4, w - 6, y + 4)
 
 
 class FlightSearchApp:
@@ -660,10 +788,20 @@ class FlightSearchApp:
         self.scanner = None
         self.searching = False
         self.flight_count = 0
-        self.airports_cache = {}
+        self.airports_cache = {}  # skyCode -> risultati di search_airports, per tutta la sessione
         self.flight_cards = []
+        self._card_pool = []  # Card nascoste pronte per update_data()
+        self.flight_results = []  # Tutti i voli trovati, anche senza card
+        self.results_truncated = False  # True se la ricerca si è fermata a MAX_RESULTS
+        self.sort_active = False  # True dopo una scelta in "Ordina per": i nuovi voli si inseriscono in ordine
+        self.cards_limit = CARDS_PAGE_SIZE
+        # Aggiornamenti chiesti dal thread di ricerca, applicati da _flush_ui
+        self._pending_ui = {}
+        self._pending_flights = []  # Voli trovati in attesa di card, stesso lock
+        self._pending_ui_lock = threading.Lock()
 
         self.create_widgets()
+        self.root.after(UI_FLUSH_MS, self._flush_ui)
 
     def create_widgets(self):
         # Main container with padding
@@ -847,21 +985,24 @@ class FlightSearchApp:
                 font=("Segoe UI", 9)).pack(side="left", padx=(0, 5))
 
         sort_price = tk.Radiobutton(sort_frame, text="Prezzo", variable=self.sort_var,
-                                   value="prezzo", bg=ModernLightStyle.BG_MAIN,
+                                   value="prezzo", command=self.sort_results,
+                                   bg=ModernLightStyle.BG_MAIN,
                                    fg=ModernLightStyle.TEXT_DARK, font=("Segoe UI", 9),
                                    activebackground=ModernLightStyle.BG_MAIN,
                                    selectcolor=ModernLightStyle.BG_MAIN)
         sort_price.pack(side="left")
 
         sort_time = tk.Radiobutton(sort_frame, text="Orario", variable=self.sort_var,
-                                  value="orario", bg=ModernLightStyle.BG_MAIN,
+                                  value="orario", command=self.sort_results,
+                                  bg=ModernLightStyle.BG_MAIN,
                                   fg=ModernLightStyle.TEXT_DARK, font=("Segoe UI", 9),
                                   activebackground=ModernLightStyle.BG_MAIN,
                                   selectcolor=ModernLightStyle.BG_MAIN)
         sort_time.pack(side="left")
 
         sort_duration = tk.Radiobutton(sort_frame, text="Durata", variable=self.sort_var,
-                                       value="durata", bg=ModernLightStyle.BG_MAIN,
+                                       value="durata", command=self.sort_results,
+                                       bg=ModernLightStyle.BG_MAIN,
                                        fg=ModernLightStyle.TEXT_DARK, font=("Segoe UI", 9),
                                        activebackground=ModernLightStyle.BG_MAIN,
                                        selectcolor=ModernLightStyle.BG_MAIN)
@@ -877,24 +1018,42 @@ class FlightSearchApp:
         scrollbar = ttk.Scrollbar(results_container, orient="vertical",
                                  command=self.canvas.yview)
 
-        self.results_frame = ttk.Frame(self.canvas, style="Main.TFrame")
+        def on_results_scroll(first, last):
+            scrollbar.set(first, last)
+            # Vicino al fondo: costruisci la pagina successiva di card
+            if float(last) >= 0.9:
+                self._load_more_cards()
 
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.configure(yscrollcommand=on_results_scroll)
 
         scrollbar.pack(side="right", fill="y")
         self.canvas.pack(side="left", fill="both", expand=True)
 
+        self.results_frame = ttk.Frame(self.canvas, style="Main.TFrame")
         self.canvas_window = self.canvas.create_window((0, 0), window=self.results_frame,
                                                        anchor="nw")
 
         self.results_frame.bind("<Configure>",
                                lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+
         self.canvas.bind("<Configure>",
                         lambda e: self.canvas.itemconfig(self.canvas_window, width=e.width))
 
-        # Mouse wheel scrolling
-        self.canvas.bind_all("<MouseWheel>",
-                            lambda e: self.canvas.yview_scroll(int(-1*(e.delta/120)), "units"))
+        # Mouse wheel scrolling: attiva solo col puntatore sopra i risultati,
+        # cosi' combobox e campi del form non passano dal callback
+        self.canvas.bind("<Enter>", lambda e: self.canvas.bind_all("<MouseWheel>", self._on_wheel))
+        self.canvas.bind("<Leave>", lambda e: self.canvas.unbind_all("<MouseWheel>"))
+
+    def _on_wheel(self, event):
+        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+
+    def _clear_cards(self):
+        # Le card non si distruggono: tornano nel pool e vengono riusate
+        for card in self.flight_cards:
+            card.pack_forget()
+        self._card_pool.extend(reversed(self.flight_cards))
+        self.flight_cards = []
+        self.canvas.yview_moveto(0)
 
     def _swap_airports(self):
         """Scambia aeroporti di partenza e arrivo"""
@@ -924,7 +1083,7 @@ class FlightSearchApp:
         # Validate input
         try:
             date_str = self.date_entry.get()
-            depart_date = datetime.datetime.strptime(date_str, "%d/%m/%Y")
+            depart_date = _parse_date(date_str)
             max_price = float(self.price_entry.get())
             min_hour = int(self.hour_entry.get())
         except ValueError:
@@ -936,10 +1095,15 @@ class FlightSearchApp:
         self.search_btn.config(state="disabled", bg="#9ca3af")
 
         # Clear previous results
-        for card in self.flight_cards:
-            card.destroy()
-        self.flight_cards = []
-
+        self._clear_cards()
+        self.flight_results = []
+        self.results_truncated = False
+        self.sort_active = False
+        self.cards_limit = CARDS_PAGE_SIZE
+
+        with self._pending_ui_lock:
+            self._pending_ui.clear()
+            self._pending_flights.clear()
         self.count_var.set("")
         self.stats_var.set("")
         self.results_title.config(text="Ricerca in corso...")
@@ -957,36 +1121,107 @@ class FlightSearchApp:
         thread.daemon = True
         thread.start()
 
+    def _set_pending_ui(self, key, value):
+        # Chiamata dal thread di ricerca: conta solo l'ultimo valore per chiave
+        with self._pending_ui_lock:
+            self._pending_ui[key] = value
+
+    def _flush_ui(self):
+        with self._pending_ui_lock:
+            pending, self._pending_ui = self._pending_ui, {}
+            flights, self._pending_flights = self._pending_flights, []
+        if flights:
+            self.add_flight_cards(flights)
+        for key, value in pending.items():
+            if key == "action":
+                self.action_var.set(value)
+            elif key == "step":
+                self.step_var.set(value)
+            elif key == "stats":
+                self.stats_var.set(value)
+            else:
+                # "maximum" / "value" della barra di avanzamento
+                self.progress_bar[key] = value
+        self.root.after(UI_FLUSH_MS, self._flush_ui)
+
+    def _search_airports(self, code):
+        # Chiamata dai thread del pool: nel caso peggiore due thread cercano lo
+        # stesso codice insieme e uno dei due risultati sovrascrive l'altro
+        airports = self.airports_cache.get(code)
+        if airports is None:
+            airports = self.scanner.search_airports(code)
+            self.airports_cache[code] = airports
+        return airports
+
     def update_action(self, text):
-        self.action_var.set(text)
-        self.root.update_idletasks()
+        self._set_pending_ui("action", text)
 
     def update_step(self, text):
-        self.step_var.set(text)
-        self.root.update_idletasks()
+        self._set_pending_ui("step", text)
 
     def update_progress(self, value, maximum=None):
         if maximum is not None:
-            self.progress_bar["maximum"] = maximum
-        self.progress_bar["value"] = value
-        self.root.update_idletasks()
+            self._set_pending_ui("maximum", maximum)
+        self._set_pending_ui("value", value)
 
     def update_stats(self, text):
-        self.stats_var.set(text)
-        self.root.update_idletasks()
+        self._set_pending_ui("stats", text)
 
     def update_count(self):
         self.count_var.set(f"✓ {self.flight_count} voli trovati")
-        self.root.update_idletasks()
 
-    def add_flight_card(self, flight):
-        """Add a flight card to results"""
-        card = FlightCard(self.results_frame, flight)
+    def queue_flight(self, flight):
+        # Chiamata dal thread di ricerca: le card arrivano a blocchi con _flush_ui
+        with self._pending_ui_lock:
+            self._pending_flights.append(flight)
+
+    def add_flight_cards(self, flights):
+        """Add flights to results; cards are built only within the current page"""
+        self.flight_count += len(flights)
+        if self.sort_active:
+            # Inserimento ordinato: la lista resta nell'ordine scelto durante la ricerca
+            key = SORT_KEYS[self.sort_var.get()]
+            first = len(self.flight_results)
+            for flight in flights:
+                idx = bisect.bisect_right(self.flight_results, key(flight), key=key)
+                self.flight_results.insert(idx, flight)
+                first = min(first, idx)
+            # Le card già visibili da "first" in poi ora mostrano altri voli
+            for card, flight in zip(self.flight_cards[first:], self.flight_results[first:]):
+                card.update_data(flight)
+        else:
+            self.flight_results.extend(flights)
+        # Le card coprono sempre l'inizio di flight_results
+        for flight in self.flight_results[len(self.flight_cards):self.cards_limit]:
+            self._build_card(flight)
+        self.update_count()
+
+    def _build_card(self, flight):
+        if self._card_pool:
+            card = self._card_pool.pop()
+            card.update_data(flight)
+        else:
+            card = FlightCard(self.results_frame, flight)
         card.pack(fill="x", pady=5, padx=5)
         self.flight_cards.append(card)
-        self.flight_count += 1
-        self.root.after(0, self.update_count)
-        self.root.update_idletasks()
+
+    def _load_more_cards(self):
+        if len(self.flight_cards) >= len(self.flight_results):
+            return
+        self.cards_limit = len(self.flight_cards) + CARDS_PAGE_SIZE
+        for flight in self.flight_results[len(self.flight_cards):self.cards_limit]:
+            self._build_card(flight)
+
+    def sort_results(self):
+        """Riordina i risultati e ricostruisce solo la prima pagina di card"""
+        self.sort_active = True
+        if not self.flight_results:
+            return
+        self.flight_results.sort(key=SORT_KEYS[self.sort_var.get()])
+        self._clear_cards()
+        self.cards_limit = CARDS_PAGE_SIZE
+        for flight in self.flight_results[:self.cards_limit]:
+            self._build_card(flight)
 
     def search_flights(self, depart_date, max_price, min_hour, origin_list, search_everywhere, dest_list=None):
         """
@@ -1028,8 +1263,20 @@ class FlightSearchApp:
             self.searching = False
             self.root.after(0, lambda: self.search_btn.config(state="normal",
                                                               bg=ModernLightStyle.PRIMARY))
-            self.root.after(0, lambda: self.results_title.config(
-                text=f"Trovati {self.flight_count} voli"))
+            self.root.after(0, self._show_final_count)
+
+    def _show_final_count(self):
+        # I voli accodati dopo l'ultimo _flush_ui vanno contati prima del titolo
+        with self._pending_ui_lock:
+            flights, self._pending_flights = self._pending_flights, []
+        if flights:
+            self.add_flight_cards(flights)
+        if self.results_truncated:
+            # Cap di MAX_RESULTS: sono i primi voli arrivati, non i più economici
+            self.results_title.config(
+                text=f"Trovati {self.flight_count} voli (ricerca interrotta a {MAX_RESULTS})")
+        else:
+            self.results_title.config(text=f"Trovati {self.flight_count} voli")
 
     def _search_everywhere_multi(self, origin_list, depart_date, max_price, min_hour):
         """Search flights to everywhere from multiple origin airports"""
@@ -1040,29 +1287,34 @@ class FlightSearchApp:
         # Collect all countries from all origins
         all_countries = {}  # skyCode -> {name, skyCode}
 
-        for origin_idx, origin in enumerate(origin_list):
-            self.update_action(f"🌍 Ricerca paesi da {origin.skyId}... ({origin_idx+1}/{total_origins})")
-            self.update_step("Interrogo Skyscanner per destinazioni sotto budget")
-            progress = 5 + (origin_idx / total_origins) * 10
-            self.update_progress(progress)
-
+        def fetch_everywhere(origin):
+            # Eseguita nei thread del pool: solo HTTP, nessun widget
             try:
-                response = self.scanner.get_flight_prices(
+                return self.scanner.get_flight_prices(
                     origin=origin,
                     destination=SpecialTypes.EVERYWHERE,
                     depart_date=depart_date
                 )
+            except SEARCH_ERRORS as e:
+                print(f"Ricerca ovunque da {origin.skyId} fallita: {e}")
+                return None
+
+        # Le richieste partono insieme; map restituisce le risposte nell'ordine
+        # delle partenze, così l'elenco dei paesi resta stabile
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            responses = executor.map(fetch_everywhere, origin_list)
+            for origin_idx, (origin, response) in enumerate(zip(origin_list, responses)):
+                self.update_action(f"🌍 Ricerca paesi da {origin.skyId}... ({origin_idx+1}/{total_origins})")
+                self.update_step("Interrogo Skyscanner per destinazioni sotto budget")
+                progress = 5 + (origin_idx / total_origins) * 10
+                self.update_progress(progress)
 
-                for r in response.json.get("everywhereDestination", {}).get("results", []):
-                    content = r.get("content", {})
-                    location = content.get("location", {})
-                    price = content.get("flightQuotes", {}).get("cheapest", {}).get("rawPrice", 999999)
-                    if location.get("name") and location.get("skyCode") and price and price <= max_price:
-                        sky_code = location["skyCode"]
-                        if sky_code not in all_countries:
-                            all_countries[sky_code] = {"name": location["name"], "skyCode": sky_code}
-            except:
-                continue
+                if response is None:
+                    continue
+
+                for sky_code, name in _iter_priced_locations(response, "everywhereDestination", max_price):
+                    if sky_code not in all_countries:
+                        all_countries[sky_code] = {"name": name, "skyCode": sky_code}
 
         countries = list(all_countries.values())
         self.update_action(f"✓ Trovati {len(countries)} paesi")
@@ -1074,37 +1326,40 @@ class FlightSearchApp:
         all_cities = {}  # skyCode -> {name, skyCode, country}
         first_origin = origin_list[0]
 
-        for i, country in enumerate(countries):
-            self.update_action(f"📍 Analisi paesi... ({i+1}/{len(countries)})")
-            self.update_step(f"Cerco città in: {country['name']}")
-            progress = 15 + (i / len(countries)) * 20
-            self.update_progress(progress)
-
+        def fetch_country(country):
+            # Eseguita nei thread del pool: solo HTTP, nessun widget
             try:
-                country_airports = self.scanner.search_airports(country["skyCode"])
+                country_airports = self._search_airports(country["skyCode"])
                 if not country_airports:
-                    continue
+                    return None
                 country_entity = next((a for a in country_airports if a.skyId == country["skyCode"]),
                                       country_airports[0])
 
-                country_response = self.scanner.get_flight_prices(
+                return self.scanner.get_flight_prices(
                     origin=first_origin, destination=country_entity, depart_date=depart_date
                 )
+            except SEARCH_ERRORS as e:
+                print(f"Ricerca paese {country['name']} fallita: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            country_responses = executor.map(fetch_country, countries)
+            for i, (country, country_response) in enumerate(zip(countries, country_responses)):
+                self.update_action(f"📍 Analisi paesi... ({i+1}/{len(countries)})")
+                self.update_step(f"Cerco città in: {country['name']}")
+                progress = 15 + (i / len(countries)) * 20
+                self.update_progress(progress)
+
+                if country_response is None:
+                    continue
 
-                for r in country_response.json.get("countryDestination", {}).get("results", []):
-                    content = r.get("content", {})
-                    location = content.get("location", {})
-                    city_price = content.get("flightQuotes", {}).get("cheapest", {}).get("rawPrice", 999999)
-                    if location.get("name") and location.get("skyCode") and city_price and city_price <= max_price:
-                        sky_code = location["skyCode"]
-                        if sky_code not in all_cities:
-                            all_cities[sky_code] = {
-                                "name": location["name"],
-                                "skyCode": sky_code,
-                                "country": country["name"]
-                            }
-            except:
-                continue
+                for sky_code, name in _iter_priced_locations(country_response, "countryDestination", max_price):
+                    if sky_code not in all_cities:
+                        all_cities[sky_code] = {
+                            "name": name,
+                            "skyCode": sky_code,
+                            "country": country["name"]
+                        }
 
         cities = list(all_cities.values())
         self.update_action(f"✓ Trovate {len(cities)} città")
@@ -1121,8 +1376,27 @@ class FlightSearchApp:
         total_searches = len(cities) * total_origins
         search_count = 0
 
-        for city in cities:
-            for origin in origin_list:
+        stop_event = threading.Event()
+
+        def fetch_city(city, origin):
+            # Eseguita nei thread del pool: solo HTTP, nessun widget
+            city_airports = self._search_airports(city["skyCode"])
+            if not city_airports or stop_event.is_set():
+                return None
+            return self.scanner.get_flight_prices(
+                origin=origin, destination=city_airports[0], depart_date=depart_date
+            )
+
+        # I risultati vengono elaborati in questo thread man mano che arrivano:
+        # voli_trovati e voli_keys non sono mai condivisi con il pool
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(fetch_city, city, origin): (city, origin)
+                for city in cities
+                for origin in origin_list
+            }
+            for future in as_completed(futures):
+                city, origin = futures[future]
                 search_count += 1
                 self.update_action(f"✈ Ricerca voli... ({search_count}/{total_searches})")
                 self.update_step(f"{origin.skyId} → {city['name']} ({city['country']})")
@@ -1130,25 +1404,34 @@ class FlightSearchApp:
                 self.update_progress(progress)
 
                 try:
-                    city_airports = self.scanner.search_airports(city["skyCode"])
-                    if not city_airports:
+                    flight_response = future.result()
+                    if flight_response is None:
                         continue
 
-                    flight_response = self.scanner.get_flight_prices(
-                        origin=origin, destination=city_airports[0], depart_date=depart_date
-                    )
-
                     self._process_flight_response(
                         flight_response, origin, city, depart_date,
                         max_price, min_hour, direct_only, same_day,
                         voli_trovati, voli_keys
                     )
-                except:
+                except RESPONSE_ERRORS as e:
+                    print(f"Ricerca {origin.skyId} → {city['name']} fallita: {e!r}")
                     continue
 
+                if len(voli_trovati) >= MAX_RESULTS:
+                    # Abbastanza voli da mostrare: le ricerche in coda non partono
+                    # e quelle già avviate saltano la chiamata dei prezzi
+                    stop_event.set()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+
         # Done
         self.update_action(f"✅ Ricerca completata!")
-        self.update_step(f"Trovati {len(voli_trovati)} voli che rispettano i tuoi criteri")
+        self.results_truncated = stop_event.is_set()
+        if stop_event.is_set():
+            self.update_step(f"Primi {len(voli_trovati)} voli trovati: limite di {MAX_RESULTS} raggiunto, "
+                             f"non sono necessariamente i più economici")
+        else:
+            self.update_step(f"Trovati {len(voli_trovati)} voli che rispettano i tuoi criteri")
         self.update_progress(100)
         self.update_stats(f"Paesi: {len(countries)} | Città: {len(cities)} | Partenze: {', '.join(origin_codes)}")
 
@@ -1170,8 +1453,17 @@ class FlightSearchApp:
         total_searches = len(origin_list) * len(dest_list)
         search_count = 0
 
-        for origin in origin_list:
-            for dest in dest_list:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    self.scanner.get_flight_prices,
+                    origin=origin, destination=dest, depart_date=depart_date
+                ): (origin, dest)
+                for origin in origin_list
+                for dest in dest_list
+            }
+            for future in as_completed(futures):
+                origin, dest = futures[future]
                 search_count += 1
                 self.update_action(f"✈ Ricerca voli... ({search_count}/{total_searches})")
                 self.update_step(f"{origin.skyId} → {dest.skyId}")
@@ -1179,9 +1471,7 @@ class FlightSearchApp:
                 self.update_progress(progress)
 
                 try:
-                    flight_response = self.scanner.get_flight_prices(
-                        origin=origin, destination=dest, depart_date=depart_date
-                    )
+                    flight_response = future.result()
 
                     city_info = {"name": dest.title, "skyCode": dest.skyId, "country": ""}
 
@@ -1190,7 +1480,8 @@ class FlightSearchApp:
                         max_price, min_hour, direct_only, same_day,
                         voli_trovati, voli_keys
                     )
-                except:
+                except RESPONSE_ERRORS as e:
+                    print(f"Ricerca {origin.skyId} → {dest.skyId} fallita: {e!r}")
                     continue
 
         # Done
@@ -1205,39 +1496,56 @@ class FlightSearchApp:
         """Process flight response and extract matching flights"""
 
         voli_visti = set()
-        for bucket in flight_response.json.get("itineraries", {}).get("buckets", []):
-            for item in bucket.get("items", []):
+        buckets = flight_response.json.get("itineraries", {}).get("buckets") or ()
+        for bucket in buckets:
+            for item in bucket.get("items", ()):
                 if item["id"] in voli_visti:
                     continue
                 voli_visti.add(item["id"])
 
-                price = item.get("price", {}).get("raw", 999999)
-                if price > max_price:
+                # Accesso diretto: i campi mancano solo in rari itinerari incompleti
+                try:
+                    price = item["price"]["raw"]
+                    leg = item["legs"][0]
+                    dep_str = leg["departure"]
+                    arr_str = leg["arrival"]
+                except (KeyError, IndexError, TypeError):
+                    continue
+                if price is None or price > max_price:
                     continue
-
-                leg = item.get("legs", [{}])[0]
-                dep_str = leg.get("departure", "")
-                arr_str = leg.get("arrival", "")
                 if not dep_str or not arr_str:
                     continue
 
-                dep = datetime.datetime.fromisoformat(dep_str)
-                arr = datetime.datetime.fromisoformat(arr_str)
+                # Filtri dal più economico: scali, stesso giorno, poi ora
+                stops = leg.get("stopCount", 0)
+                if direct_only and stops > 0:
+                    continue
 
-                if dep.hour < min_hour:
+                # Le stringhe ISO (AAAA-MM-GGTHH:MM:SS) sono a larghezza fissa:
+                # ora e data si leggono per posizione, senza parsing
+                if same_day and arr_str[:10] != dep_str[:10]:
                     continue
 
-                if same_day and arr.date() != dep.date():
+                if int(dep_str[11:13]) < min_hour:
                     continue
 
-                stops = leg.get("stopCount", 0)
-                if direct_only and stops > 0:
+                dest_info = leg.get("destination", {})
+                origin_info = leg.get("origin", {})
+
+                codice_dest = dest_info.get("displayCode", city["skyCode"])
+                codice_origine = origin_info.get("displayCode", origin.skyId)
+                partenza = dep_str[11:16]
+
+                # Chiave unica per evitare duplicati (include origine!): controllata
+                # prima di costruire scali e dizionario del volo
+                key = (codice_origine, codice_dest, partenza, price)
+                if key in voli_keys:
                     continue
+                voli_keys.add(key)
 
+                # Da qui in poi solo voli accettati: lettura e formattazione dei restanti campi
                 duration = leg.get("durationInMinutes", 0)
                 carriers = leg.get("carriers", {}).get("marketing", [])
-                dest_info = leg.get("destination", {})
-                origin_info = leg.get("origin", {})
 
                 # Extract stopover details from segments
                 segments = leg.get("segments", [])
@@ -1248,50 +1556,53 @@ class FlightSearchApp:
                         next_seg = segments[seg_idx + 1]
 
                         stop_dest = seg.get("destination", {})
-                        stop_city = stop_dest.get("city", stop_dest.get("name", ""))
+                        # Fallback valutato solo se manca "city"
+                        stop_city = stop_dest["city"] if "city" in stop_dest else stop_dest.get("name", "")
                         stop_code = stop_dest.get("displayCode", "")
 
                         seg_arr = seg.get("arrival", "")
                         next_dep = next_seg.get("departure", "")
 
+                        # Ogni orario analizzato una sola volta, poi riusato
+                        arr_time = _parse_iso(seg_arr)
+                        dep_time = _parse_iso(next_dep)
+
                         layover_min = 0
-                        if seg_arr and next_dep:
-                            try:
-                                arr_time = datetime.datetime.fromisoformat(seg_arr)
-                                dep_time = datetime.datetime.fromisoformat(next_dep)
-                                layover_min = int((dep_time - arr_time).total_seconds() / 60)
-                            except:
-                                pass
+                        if arr_time and dep_time:
+                            layover_min = int((dep_time - arr_time).total_seconds() / 60)
 
                         stopovers.append({
                             "città": stop_city,
                             "codice": stop_code,
-                            "arrivo": datetime.datetime.fromisoformat(seg_arr).strftime("%H:%M") if seg_arr else "",
-                            "partenza": datetime.datetime.fromisoformat(next_dep).strftime("%H:%M") if next_dep else "",
+                            # HH:MM per posizione, come per la tratta principale
+                            "arrivo": seg_arr[11:16] if arr_time else "",
+                            "partenza": next_dep[11:16] if dep_time else "",
                             "attesa": f"{layover_min // 60}h {layover_min % 60:02d}min" if layover_min > 0 else ""
                         })
 
+                compagnia = carriers[0].get("name", "N/A") if carriers else "N/A"
                 flight = {
                     "città": dest_info.get("city", city["name"]),
-                    "paese": dest_info.get("country", city.get("country", "")),
-                    "codice_dest": dest_info.get("displayCode", city["skyCode"]),
-                    "codice_origine": origin_info.get("displayCode", origin.skyId),  # Codice aeroporto partenza
+                    "paese": dest_info["country"] if "country" in dest_info else city.get("country", ""),
+                    "codice_dest": codice_dest,
+                    "codice_origine": codice_origine,  # Codice aeroporto partenza
                     "prezzo": price,
-                    "partenza": dep.strftime("%H:%M"),
-                    "arrivo": arr.strftime("%H:%M"),
+                    "partenza": partenza,
+                    "arrivo": arr_str[11:16],
                     "durata": f"{duration // 60}h {duration % 60:02d}min",
                     "durata_min": duration,
                     "scali": stops,
                     "stopovers": stopovers,
-                    "compagnia": carriers[0].get("name", "N/A") if carriers else "N/A"
+                    "compagnia": compagnia,
+                    # Testi della card preparati qui, fuori dal thread di Tk
+                    "stop_lines": [_stop_line(stop) for stop in stopovers],
+                    "stops_text": "Diretto" if stops == 0 else f"{stops} scalo",
+                    "price_text": f"€ {price:.0f}",
+                    "airline_short": compagnia[:15],
                 }
 
-                # Chiave unica per evitare duplicati (include origine!)
-                key = f"{flight['codice_origine']}-{flight['codice_dest']}-{flight['partenza']}-{flight['prezzo']}"
-                if key not in voli_keys:
-                    voli_keys.add(key)
-                    voli_trovati.append(flight)
-                    self.root.after(0, lambda f=flight: self.add_flight_card(f))
+                voli_trovati.append(flight)
+                self.queue_flight(flight)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,16 @@
+# Configurazione di produzione: gunicorn la carica in automatico dalla root.
+#   gunicorn app:app
+#
+# Le ricerche passano quasi tutto il tempo in attesa di Skyscanner, quindi
+# servono molte richieste concorrenti per processo (thread) e pochi processi:
+# scanner, sessione curl e cache aeroporti sono condivisi all'interno di ognuno.
+# Niente gevent: libcurl blocca a livello C e il monkey-patching non lo rende
+# cooperativo.
+
+bind = "0.0.0.0:5000"
+worker_class = "gthread"
+workers = 2
+threads = 32
+# Lo stream SSE può durare fino a SEARCH_TIMEOUT_SECONDS
+timeout = 330
+keepalive = 5
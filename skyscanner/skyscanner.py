@@ -3,6 +3,7 @@ import datetime
 import time
 import uuid
 import orjson
+from concurrent.futures import ThreadPoolExecutor
 from typeguard import typechecked
 from . import config
 from .px import PXSolver
@@ -37,6 +38,7 @@ class SkyScanner:
         proxy: str = "",
         px_authorization: str | None = None,
         verify: bool = True,
+        session: curl_cffi.Session | None = None,
     ):
         """
         Initialize the SkyScanner client.
@@ -47,9 +49,12 @@ class SkyScanner:
             market (str): Market region code (default: "US").
             retry_delay (int): Seconds to wait between polling retries (default: 2).
             max_retries (int): Maximum number of polling retries (default: 15).
-            proxies (dict): Proxy configuration for HTTP requests.
+            proxy (str): Proxy URL for HTTP requests, also used by the PX solver (default: "").
             px_authorization (str | None): Optional pre-generated PX authorization token.
             verify (bool): If set to False requests is not gonna verify the ssl certificate (default: True).
+            session (curl_cffi.Session | None): Existing session to reuse, keeping its pooled
+                connections across clients. The Skyscanner headers are set on it, and so are
+                `proxy` (when given) and `verify=False` (when given) (default: None).
 
         Raises:
             None
@@ -78,14 +83,23 @@ class SkyScanner:
         self.currency = currency
         self.locale = locale
         self.max_retries = max_retries
-        self.session = curl_cffi.Session(
-            headers=headers,
-            ja3=config.JA3,
-            extra_fp=config.EXTRA_FP,
-            akamai=config.AKAMAI,
-            proxy=proxy,
-            verify=verify,
-        )
+        if session is not None:
+            session.headers.update(headers)
+            # Same proxy/verify as the PX solver, otherwise they would be silently ignored
+            if proxy:
+                session.proxies = {"all": proxy}
+            if not verify:
+                session.verify = False
+            self.session = session
+        else:
+            self.session = curl_cffi.Session(
+                headers=headers,
+                ja3=config.JA3,
+                extra_fp=config.EXTRA_FP,
+                akamai=config.AKAMAI,
+                proxy=proxy,
+                verify=verify,
+            )
 
     @typechecked
     def get_flight_prices(
@@ -211,6 +225,68 @@ class SkyScanner:
 
         raise AttemptsExhaustedIncompleteResponse()
 
+    @typechecked
+    def get_flight_prices_batch(
+        self,
+        routes: list[tuple[Airport, Airport]],
+        depart_date: datetime.datetime | SpecialTypes | None = None,
+        return_date: datetime.datetime | SpecialTypes | None = None,
+        cabinClass: CabinClass = CabinClass.ECONOMY,
+        adults: int = 1,
+        childAges: list[int] = [],
+        max_workers: int = 8,
+    ) -> dict[tuple[str, str], SkyscannerResponse | Exception]:
+        """
+        Search flight prices for several origin/destination pairs at once.
+
+        The unified search endpoint accepts a single itinerary per request, so the
+        searches are dispatched concurrently over this client's session. Duplicate
+        pairs are searched only once.
+
+        Args:
+            routes (list[tuple[Airport, Airport]]): (origin, destination) pairs to search.
+            depart_date (datetime | SpecialTypes | None): Departure date or special enum (default: now).
+            return_date (datetime | SpecialTypes | None): Return date or special enum (optional).
+            cabinClass (CabinClass): Cabin class for travel (default: ECONOMY).
+            adults (int): Number of adult passengers (max 8).
+            childAges (list[int]): List of child ages (each 0–17, max 8 children).
+            max_workers (int): Maximum number of searches running at the same time (default: 8).
+
+        Returns:
+            dict[tuple[str, str], SkyscannerResponse | Exception]: Result for each
+                (origin skyId, destination skyId) pair, or the exception raised by
+                `get_flight_prices` for that pair.
+        """
+        unique_routes = {
+            (origin.skyId, destination.skyId): (origin, destination)
+            for origin, destination in routes
+        }
+        if not unique_routes:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_routes))) as executor:
+            futures = {
+                key: executor.submit(
+                    self.get_flight_prices,
+                    origin,
+                    destination,
+                    depart_date,
+                    return_date,
+                    cabinClass,
+                    adults,
+                    childAges,
+                )
+                for key, (origin, destination) in unique_routes.items()
+            }
+
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = e
+        return results
+
     @typechecked
     def search_airports(
         self, query: str, depart_date=None, return_date=None
@@ -250,7 +326,7 @@ class SkyScanner:
                 f"Error when scraping airports, code: {req.status_code} text: {req.text}"
             )
 
-        data = req.json()
+        data = orjson.loads(req.content)
         results = []
         for e in data["inputSuggest"]:
             # Extract entity type (PLACE_TYPE_AIRPORT, PLACE_TYPE_CITY, PLACE_TYPE_COUNTRY)
@@ -315,7 +391,7 @@ class SkyScanner:
             Location(
                 location["entity_name"], location["entity_id"], location["location"]
             )
-            for location in req.json()
+            for location in orjson.loads(req.content)
         ]
 
     @typechecked
@@ -344,7 +420,7 @@ class SkyScanner:
                 f"Error when fetching geo hierarchy, code: {req.status_code} text: {req.text}"
             )
 
-        return req.json()
+        return orjson.loads(req.content)
 
     @typechecked
     def get_airport_by_code(self, airport_code: str) -> Airport:
@@ -602,7 +678,7 @@ class SkyScanner:
 
         for _ in range(self.max_retries):
             req = self.session.get(url, params=params)
-            req_data = req.json()
+            req_data = orjson.loads(req.content)
             params["reqn"] = str(int(params["reqn"]) + 1)
 
             count = req_data["groups_count"]